@@ -0,0 +1,147 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import _LOGGER
+
+# Called with the target and the text of a summary of the alerts suppressed for it
+SummarySender = Callable[[str, str], None]
+
+
+class TokenBucket:
+    """Allows bursts of up to `capacity` and `capacity` per `period_sec` in the long run."""
+
+    def __init__(self, capacity: int, period_sec: float):
+        self.capacity = capacity
+        self.period_sec = period_sec
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period_sec
+
+    def available(self) -> int:
+        self._refill()
+        return int(self._tokens)
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one already is."""
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+    def take(self, count: int = 1) -> bool:
+        self._refill()
+        if self._tokens < count:
+            return False
+        self._tokens -= count
+        return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+@dataclass
+class _TargetState:
+    bucket: TokenBucket | None
+    last_message: str | None = None
+    last_sent_at: float = 0.0
+    suppressed: int = 0
+    latest_suppressed: str | None = None
+    flush: CALLBACK_TYPE | None = None
+
+
+class AdmissionControl:
+    """Rate limits and deduplicates the notifications of one service before they are queued.
+
+    With a summary sender, the alerts rate limited for a target are counted: the next alert let through
+    mentions them, or else a summary goes out by itself once the target may be notified again.
+    Duplicates aren't counted, the target already got that very alert.
+    """
+
+    def __init__(
+            self, hass: HomeAssistant, per_target: int | None, period_sec: float, dedup_window_sec: float,
+            send_summary: SummarySender | None = None,
+    ):
+        self.hass = hass
+        self.per_target = per_target
+        self.period_sec = period_sec
+        self.dedup_window_sec = dedup_window_sec
+        self._send_summary = send_summary
+        self._targets: dict[str, _TargetState] = {}
+
+    @callback
+    def admit(self, target: str, message: str) -> str | None:
+        """Return the message to send to the target, with the alerts suppressed before it folded in.
+
+        Returns None if the notification is suppressed.
+        """
+        state = self._targets.get(target)
+        if state is None:
+            bucket = TokenBucket(self.per_target, self.period_sec) if self.per_target else None
+            state = self._targets[target] = _TargetState(bucket)
+
+        now = time.monotonic()
+        if message == state.last_message and now - state.last_sent_at < self.dedup_window_sec:
+            _LOGGER.info(f"Suppressing notification for {target}: duplicate")
+            return None
+
+        if state.bucket is not None and not state.bucket.take():
+            self._suppress(state, target, message, state.bucket.delay())
+            return None
+
+        state.last_message = message
+        state.last_sent_at = now
+        if state.suppressed and self._send_summary is not None:
+            message = f"{message}\n(+{state.suppressed} more alert{'s' if state.suppressed > 1 else ''})"
+            self._reset(state)
+        return message
+
+    def _suppress(self, state: _TargetState, target: str, message: str, retry_sec: float) -> None:
+        _LOGGER.info(f"Suppressing notification for {target}: rate limited")
+        if self._send_summary is None:
+            return
+
+        state.suppressed += 1
+        state.latest_suppressed = message
+        if state.flush is None:
+            state.flush = async_call_later(self.hass, retry_sec, partial(self._flush, target))
+
+    @callback
+    def _flush(self, target: str, _now: datetime) -> None:
+        state = self._targets[target]
+        state.flush = None
+        if not state.suppressed:
+            return
+        if state.bucket is not None and not state.bucket.take():
+            # Not refilled yet, the timer may fire a little early
+            state.flush = async_call_later(self.hass, state.bucket.delay(), partial(self._flush, target))
+            return
+
+        count = state.suppressed
+        summary = f"{count} more alert{'s' if count > 1 else ''}, latest: {state.latest_suppressed}"
+        state.last_message = summary
+        state.last_sent_at = time.monotonic()
+        self._reset(state)
+        self._send_summary(target, summary)
+
+    @staticmethod
+    def _reset(state: _TargetState) -> None:
+        state.suppressed = 0
+        state.latest_suppressed = None
+        if state.flush is not None:
+            state.flush()
+            state.flush = None
@@ -0,0 +1,241 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Typed parsing of AT command responses (3GPP TS 27.005/27.007), without I/O."""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+
+
+class FinalResult(str, Enum):
+    OK = "OK"
+    ERROR = "ERROR"
+    CME_ERROR = "+CME ERROR"
+    CMS_ERROR = "+CMS ERROR"
+    BUSY = "BUSY"
+    NO_CARRIER = "NO CARRIER"
+    NO_ANSWER = "NO ANSWER"
+    NO_DIALTONE = "NO DIALTONE"
+    PROMPT = ">"
+
+
+# Final result codes of ATD which some modems also send unsolicited when a call ends
+CALL_END_CODES = (FinalResult.NO_CARRIER.value, FinalResult.BUSY.value, FinalResult.NO_ANSWER.value)
+
+# End marker sets, as tuples so a line is matched with a single str.startswith call
+FINAL_RESULTS = ("OK", "ERROR", "+CME ERROR", "+CMS ERROR")
+DIAL_RESULTS = FINAL_RESULTS + CALL_END_CODES + ("NO DIALTONE",)
+PROMPT_RESULTS = (">",) + FINAL_RESULTS
+
+_EXACT_RESULTS = {result.value: result for result in FinalResult}
+
+# Text mode <scts>: yy/MM/dd,hh:mm:ss followed by the offset from UTC in quarters of an hour
+_SCTS = re.compile(r"^(\d\d)/(\d\d)/(\d\d),(\d\d):(\d\d):(\d\d)([+-]\d+)?$")
+
+
+@dataclass(frozen=True)
+class AtError:
+    result: FinalResult
+    # Numeric <err> of +CME/+CMS ERROR, None for a plain ERROR or verbose error text
+    code: int | None = None
+    text: str = ""
+
+    def __str__(self) -> str:
+        return f"{self.result.value}: {self.text}" if self.text else self.result.value
+
+
+@dataclass(frozen=True)
+class AtResponse:
+    # Informational lines, the final result code excluded
+    lines: list[str]
+    # None if the modem didn't send a final result code before the timeout
+    result: FinalResult | None
+    error: AtError | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.result == FinalResult.OK
+
+    @property
+    def timed_out(self) -> bool:
+        return self.result is None
+
+    def first(self, prefix: str) -> str | None:
+        """Return the first informational line starting with the prefix, e.g. "+CMGS:"."""
+        return next((line for line in self.lines if line.startswith(prefix)), None)
+
+    def __str__(self) -> str:
+        final = [str(self.error or self.result.value)] if self.result is not None else ["<timeout>"]
+        return " ".join(self.lines + final)
+
+
+@dataclass(frozen=True)
+class CallEntry:
+    """One call listed by +CLCC: <idx>,<dir>,<stat>,<mode>,<mpty>[,<number>,<type>]."""
+
+    index: int
+    outgoing: bool
+    # <stat>: 0 active, 1 held, 2 dialing, 3 alerting, 4 incoming, 5 waiting, 6 released (vendor)
+    stat: int
+    voice: bool
+    number: str | None = None
+
+
+@dataclass(frozen=True)
+class Registration:
+    """+CREG/+CEREG: [<n>,]<stat>[,<lac>,<ci>[,<act>]], as an answer to the query or unsolicited."""
+
+    stat: int
+
+    @property
+    def registered(self) -> bool:
+        # 1 registered at home, 5 roaming
+        return self.stat in (1, 5)
+
+
+@dataclass(frozen=True)
+class SignalQuality:
+    """+CSQ: <rssi>,<ber>, where 99 means unknown."""
+
+    rssi: int
+    ber: int
+
+    @property
+    def dbm(self) -> int | None:
+        return None if self.rssi == 99 else -113 + 2 * self.rssi
+
+
+@dataclass(frozen=True)
+class StatusReport:
+    """SMS-STATUS-REPORT of +CDS, in text mode: <fo>,<mr>,[<ra>],[<tora>],<scts>,<dt>,<st>."""
+
+    reference: int
+    recipient: str | None
+    # <st>, TP-Status of 3GPP TS 23.040
+    status: int
+
+    @property
+    def delivered(self) -> bool:
+        return self.status < 0x20
+
+    @property
+    def pending(self) -> bool:
+        """The SMSC hasn't delivered the message yet but is still trying."""
+        return 0x20 <= self.status < 0x40
+
+
+@dataclass(frozen=True)
+class ListedMessage:
+    """One message listed by AT+CMGL, its +CMGL: fields followed by the text, or the PDU in PDU mode."""
+
+    index: int
+    # Text mode: <stat>,<oa>,[<alpha>],<scts date>,<scts time>; PDU mode: <stat>,[<alpha>],<length>
+    fields: tuple[str, ...]
+    body: str
+
+
+def parse_response(lines: list[str]) -> AtResponse:
+    """Split the lines collected by Modem.execute_at into the informational part and the final result."""
+    if not lines:
+        return AtResponse([], None)
+
+    *info, last = lines
+    if (result := _EXACT_RESULTS.get(last)) is not None:
+        return AtResponse(info, result, AtError(result) if result == FinalResult.ERROR else None)
+
+    for result in (FinalResult.CME_ERROR, FinalResult.CMS_ERROR):
+        if last.startswith(result.value):
+            text = last[len(result.value):].lstrip(":").strip()
+            code = int(text) if text.isdigit() else None
+            return AtResponse(info, result, AtError(result, code, text))
+
+    # Cut short by the timeout, or ended by an informational marker like +CMGS:
+    return AtResponse(lines, None)
+
+
+def _fields(line: str, prefix: str) -> list[str] | None:
+    if not line.startswith(prefix):
+        return None
+    return [field.strip().strip('"') for field in line[len(prefix):].split(",")]
+
+
+def _int(field: str) -> int | None:
+    return int(field) if field.isdigit() else None
+
+
+def parse_clcc(line: str) -> CallEntry | None:
+    fields = _fields(line, "+CLCC:")
+    if fields is None or len(fields) < 5 or None in (values := [_int(f) for f in fields[:4]]):
+        return None
+
+    index, direction, stat, mode = values
+    number = fields[5] if len(fields) > 5 and fields[5] else None
+    return CallEntry(index=index, outgoing=direction == 0, stat=stat, voice=mode == 0, number=number)
+
+
+def parse_cmgs(line: str) -> int | None:
+    """Return the message reference of +CMGS: <mr>[,<scts>]."""
+    fields = _fields(line, "+CMGS:")
+    return _int(fields[0]) if fields else None
+
+
+def parse_registration(line: str) -> Registration | None:
+    for prefix in ("+CREG:", "+CEREG:"):
+        if not line.startswith(prefix):
+            continue
+        # The query answer starts with <n>, the unsolicited report with <stat>, and <lac> is always quoted
+        fields = [field.strip() for field in line[len(prefix):].split(",")]
+        stat = _int(fields[1] if len(fields) >= 2 and fields[1].isdigit() else fields[0])
+        return Registration(stat) if stat is not None else None
+    return None
+
+
+def parse_csq(line: str) -> SignalQuality | None:
+    fields = _fields(line, "+CSQ:")
+    if fields is None or len(fields) < 2 or None in (values := [_int(f) for f in fields[:2]]):
+        return None
+    return SignalQuality(*values)
+
+
+def parse_cds(line: str) -> StatusReport | None:
+    # <scts> and <dt> hold a comma of their own, but only the fields around them are needed
+    fields = _fields(line, "+CDS:")
+    if fields is None or len(fields) < 7 or None in (values := [_int(fields[1]), _int(fields[-1])]):
+        return None
+    reference, status = values
+    return StatusReport(reference=reference, recipient=fields[2] or None, status=status)
+
+
+def parse_cmgl(lines: list[str]) -> list[ListedMessage]:
+    messages = []
+    for line in lines:
+        if (fields := _fields(line, "+CMGL:")) is not None:
+            if (index := _int(fields[0])) is not None:
+                messages.append(ListedMessage(index, tuple(fields[1:]), ""))
+        elif messages:
+            # A text mode message may span several lines
+            last = messages[-1]
+            messages[-1] = ListedMessage(last.index, last.fields, f"{last.body}\n{line}" if last.body else line)
+    return messages
+
+
+def parse_clip(line: str) -> str | None:
+    """Return the caller's number of +CLIP: <number>,<type>[,...], None if withheld."""
+    fields = _fields(line, "+CLIP:")
+    return fields[0] or None if fields else None
+
+
+def parse_scts(text: str) -> datetime | None:
+    if (match := _SCTS.match(text.strip('"'))) is None:
+        return None
+    year, month, day, hour, minute, second = (int(group) for group in match.groups()[:6])
+    offset = timedelta(minutes=15 * int(match.group(7) or 0))
+    try:
+        return datetime(2000 + year, month, day, hour, minute, second, tzinfo=timezone(offset))
+    except ValueError:
+        return None
@@ -3,97 +3,206 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import asyncio
+from typing import TYPE_CHECKING
+
 from homeassistant.exceptions import HomeAssistantError
 
+from ..at_response import DIAL_RESULTS, FinalResult
 from ..const import _LOGGER, EndedReason
 from ..modem import Modem
+from .call_state import CallState, parse_call_state
+
+if TYPE_CHECKING:
+    from ..profiles import ModemProfile
 
 class ATDialer:
     at_command = "ATD"
-
-    def __init__(self, dial_timeout_sec: int, call_duration_sec: int):
+    # Only used on modems which can't report call state changes by themselves
+    poll_interval_sec = 1
+    # Fallback pause for modems which don't answer AT after the Escape reset
+    reset_fallback_sec = 1
+    # Pause before hanging up, for hardware which needs time to settle the final call state
+    hangup_delay_sec = 0
+    # Vendor settings the hardware needs before its first call, applied once per connection
+    init_commands: tuple[str, ...] = ()
+    # AT+CHUP este comanda specifică pentru a închide toate apelurile active
+    # ATH ca măsură de siguranță finală pentru a pune "receptorul în furcă"
+    hangup_commands: tuple[str, ...] = ("AT+CHUP", "ATH")
+    # Prefixes of vendor URCs and the call state they report, on top of the standard ones
+    call_state_urcs: tuple[tuple[str, CallState], ...] = ()
+    # Time the watchdog gets to free a line still busy after hanging up, before the port is reopened
+    recovery_timeout_sec = 20
+
+    def __init__(self, dial_timeout_sec: int, call_duration_sec: int, profile: "ModemProfile | None" = None):
         self._dial_sec = dial_timeout_sec
         self._call_sec = call_duration_sec
+        if profile is not None:
+            self.at_command = profile.dial_command
+            self.init_commands = profile.init_commands
+            self.hangup_commands = profile.hangup_commands
+            self.hangup_delay_sec = profile.hangup_delay_sec
+            self.call_state_urcs = profile.call_state_urcs
 
     async def dial(self, modem: Modem, phone_number: str) -> EndedReason:
         # 1. Resetare buffer modem (Escape) - Verificată în shell pentru deblocare
-        _LOGGER.debug("Clearing modem buffer with Escape (\x1B) before dialing")
-        await modem.execute_at("\x1B", timeout=2, end_markers=[])
-        await asyncio.sleep(1) # Pauză de stabilitate după resetare
+        if not await modem.reset():
+            await asyncio.sleep(self.reset_fallback_sec) # Pauză de stabilitate după resetare
 
         # 2. Curățăm numărul de telefon
         clean_number = phone_number.replace("+", "")
         _LOGGER.debug(f"Dialing +{clean_number}...")
 
+        for command in self.init_commands:
+            await modem.setup(command)
+
+        call_reports = await modem.setup("AT+CLCC=1")
+
+        # Otherwise the modem takes the vendor reports of the profile for stray lines and drops them
+        modem.add_urc_prefixes(prefix for prefix, _ in self.call_state_urcs)
+
+        # Subscribe before dialing so early ^ORIG/^CONF/+CLCC reports aren't missed
+        events: asyncio.Queue[CallState] = asyncio.Queue()
+
+        def on_urc(line: str) -> None:
+            if (state := self._parse_call_state(line)) is not None:
+                events.put_nowait(state)
+
+        remove_listener = modem.add_urc_listener(on_urc)
         try:
             # 3. Trimitere comandă de apel (ATD) cu ";" obligatoriu pentru voce
-            lines = await modem.execute_at(
-                f"{self.at_command}+{clean_number};",
-                timeout=10,
-                end_markers=["OK", "ERROR", "BUSY", "NO CARRIER", "+CME ERROR"]
-            )
-            reply = " ".join(lines)
-            _LOGGER.debug(f"Modem replied with {reply}")
-
-            if "BUSY" in reply:
+            with modem.metrics.phase("dial"):
+                response = await modem.request(
+                    f"{self.at_command}+{clean_number};", timeout=10, end_markers=DIAL_RESULTS)
+            _LOGGER.debug(f"Modem replied with {response}")
+
+            if response.result == FinalResult.BUSY:
                 raise HomeAssistantError("Busy")
 
-            if "ERROR" in reply or "NO CARRIER" in reply:
-                raise HomeAssistantError(f"Modem replied with an error: {reply}")
+            # No final result yet is fine: some modems only answer ATD once the call state changes
+            if not (response.ok or response.timed_out):
+                raise HomeAssistantError(f"Modem replied with an error: {response}")
 
+            # Lets the dispatcher run the jobs allowed during a call, like SMS, on this modem meanwhile
+            modem.call_active.set()
             try:
-                ended_reason = await self._wait_for_answer(modem)
+                with modem.metrics.phase("ring"):
+                    ended_reason = await self._wait_for_answer(modem, events, call_reports)
             except asyncio.TimeoutError:
                 ended_reason = EndedReason.NOT_ANSWERED
 
             # 4. Închidere apel - Logica îmbunătățită pentru eliberarea liniei
             _LOGGER.debug(f"Call finished with reason: {ended_reason}. Starting hangup sequence...")
-            
-            # Oferim modemului o secundă să proceseze starea finală înainte de CHUP
-            await asyncio.sleep(1) 
+            await self._hang_up(modem)
 
-            # AT+CHUP este comanda specifică pentru a închide toate apelurile active
-            _LOGGER.debug("Sending AT+CHUP (Release all calls)...")
-            await modem.execute_at("AT+CHUP", timeout=5, end_markers=["OK", "ERROR"])
-            
-            # ATH ca măsură de siguranță finală pentru a pune "receptorul în furcă"
-            _LOGGER.debug("Sending ATH (Hang-up fallback)...")
-            await modem.execute_at("ATH", timeout=2, end_markers=["OK", "ERROR"])
-            
             _LOGGER.info(f"Call ended and line cleared: {ended_reason}")
             return ended_reason
             
         except asyncio.TimeoutError:
             raise HomeAssistantError(f"Timeout while dialing +{clean_number}")
-
-    async def _wait_for_answer(self, modem: Modem):
+        except asyncio.CancelledError:
+            # Aborted, e.g. someone else answered first, possibly before the modem even replied to ATD:
+            # don't leave the callee's phone ringing
+            _LOGGER.debug(f"Call to +{clean_number} cancelled. Starting hangup sequence...")
+            await asyncio.shield(self._hang_up(modem))
+            raise
+        finally:
+            modem.call_active.clear()
+            remove_listener()
+
+    async def _hang_up(self, modem: Modem) -> None:
+        with modem.metrics.phase("hangup"):
+            await self._release_calls(modem)
+            await self._ensure_line_idle(modem)
+
+    async def _ensure_line_idle(self, modem: Modem) -> None:
+        """Make sure the call is really gone, so the next alert doesn't start with the modem off-hook.
+
+        Escalates from Escape to ATH to switching the radio off and on, and as a last resort closes
+        the port for the session to reopen it on next use.
+        """
+        steps = (
+            ("Escape", lambda: modem.reset(timeout=2)),
+            ("ATH", lambda: modem.request("ATH", timeout=5)),
+            ("AT+CFUN", lambda: self._restart_radio(modem)),
+        )
+        try:
+            async with asyncio.timeout(self.recovery_timeout_sec):
+                if await self._line_idle(modem):
+                    return
+                for name, recover in steps:
+                    _LOGGER.warning(f"Line still busy after hanging up, trying {name}...")
+                    await recover()
+                    if await self._line_idle(modem):
+                        _LOGGER.info(f"Line cleared by {name}")
+                        return
+        except TimeoutError:
+            pass
+
+        _LOGGER.error("Line still busy after hanging up, reopening the port")
+        try:
+            await modem.close()
+        except OSError as e:
+            _LOGGER.debug(f"Error while closing the port: {e}")
+
+    async def _line_idle(self, modem: Modem) -> bool:
+        response = await modem.request("AT+CLCC", timeout=2)
+        # A modem too busy to answer may well be stuck in the call
+        if response.timed_out:
+            return False
+        return all(self._parse_call_state(line) in (None, CallState.ENDED) for line in response.lines)
+
+    async def _restart_radio(self, modem: Modem) -> None:
+        # Minimum functionality drops every call, the modem registers again once back to full
+        await modem.request("AT+CFUN=0", timeout=10)
+        await modem.request("AT+CFUN=1", timeout=10)
+
+    async def _release_calls(self, modem: Modem) -> None:
+        if self.hangup_delay_sec:
+            await asyncio.sleep(self.hangup_delay_sec)
+
+        for command in self.hangup_commands:
+            _LOGGER.debug(f"Sending {command}...")
+            await modem.request(command, timeout=5)
+
+    async def _wait_for_answer(self, modem: Modem, events: asyncio.Queue[CallState], call_reports: bool):
         _LOGGER.debug(f"Waiting up to {self._dial_sec} seconds for answer...")
 
+        # Without auto-reports, vendor codes like ^CONN/^CEND may still arrive between polls
+        poll_interval = None if call_reports else self.poll_interval_sec
+
         is_ringing = False
         async with asyncio.timeout(self._dial_sec) as timeout:
             while True:
-                # Monitorizăm starea apelului
-                lines = await modem.execute_at(
-                    "AT+CLCC",
-                    timeout=2,
-                    end_markers=["OK", "ERROR", "+CME ERROR"]
-                )
-                reply = " ".join(lines)
-                _LOGGER.debug(f"Modem replied with {reply}")
-
-                if not is_ringing and "+CLCC: 1,0,3" in reply:
+                try:
+                    state = await asyncio.wait_for(events.get(), poll_interval)
+                except TimeoutError:
+                    state = await self._poll_call_state(modem)
+
+                if state == CallState.RINGING and not is_ringing:
                     is_ringing = True
                     _LOGGER.info(f"Callee's phone started ringing...")
                     new_deadline = asyncio.get_running_loop().time() + self._call_sec
                     timeout.reschedule(new_deadline)
                     continue
 
-                # Cifra 0 în +CLCC înseamnă apel activ (răspuns)
-                if "+CLCC: 1,0,0" in reply:
+                if state == CallState.ANSWERED:
                     _LOGGER.info("Call answered by target.")
                     return EndedReason.ANSWERED
 
-                if "+CLCC: 1,0" not in reply:
+                if state == CallState.ENDED:
                     return EndedReason.DECLINED
 
-                await asyncio.sleep(1)
\ No newline at end of file
+    async def _poll_call_state(self, modem: Modem) -> CallState:
+        # Monitorizăm starea apelului
+        response = await modem.request("AT+CLCC", timeout=2)
+        _LOGGER.debug(f"Modem replied with {response}")
+
+        states = [state for line in response.lines if (state := self._parse_call_state(line)) is not None]
+        # No outgoing call listed means the callee declined or the network dropped it
+        return max(states, key=list(CallState).index, default=CallState.ENDED)
+
+    def _parse_call_state(self, line: str) -> CallState | None:
+        for prefix, state in self.call_state_urcs:
+            if line.startswith(prefix):
+                return state
+        return parse_call_state(line)
@@ -1,9 +0,0 @@
-# This Source Code Form is subject to the terms of the Mozilla Public
-# License, v. 2.0. If a copy of the MPL was not distributed with this
-# file, You can obtain one at https://mozilla.org/MPL/2.0/.
-
-from .at_dialer import ATDialer
-
-
-class ATToneDialer(ATDialer):
-    at_command = "ATDT"
@@ -0,0 +1,35 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from typing import TYPE_CHECKING
+
+from ..const import _LOGGER, EndedReason
+from ..modem import Modem
+from .at_dialer import ATDialer
+
+if TYPE_CHECKING:
+    from ..profiles import ProfileRegistry
+
+
+class AutoDialer:
+    """Dials with the profile matching each modem's probed manufacturer, so a pool may mix vendors."""
+
+    def __init__(self, dial_timeout_sec: int, call_duration_sec: int, registry: "ProfileRegistry"):
+        self._dial_sec = dial_timeout_sec
+        self._call_sec = call_duration_sec
+        self._registry = registry
+        self._dialers: dict[str, ATDialer] = {}
+
+    async def dial(self, modem: Modem, phone_number: str) -> EndedReason:
+        return await (await self._get_dialer(modem)).dial(modem, phone_number)
+
+    async def _get_dialer(self, modem: Modem) -> ATDialer:
+        identity = modem.capabilities.identity if modem.capabilities is not None else ""
+        profile = self._registry.match(identity)
+        if (dialer := self._dialers.get(profile.name)) is None:
+            _LOGGER.debug(f"Using the {profile.name} profile")
+            dialer = self._dialers[profile.name] = await self._registry.async_create_dialer(
+                profile.name, self._dial_sec, self._call_sec
+            )
+        return dialer
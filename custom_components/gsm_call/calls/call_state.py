@@ -0,0 +1,42 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from enum import Enum
+
+from ..at_response import CALL_END_CODES, parse_clcc
+
+
+class CallState(str, Enum):
+    DIALING = "dialing"
+    RINGING = "ringing"
+    ANSWERED = "answered"
+    ENDED = "ended"
+
+
+# <stat> field of +CLCC, see 3GPP TS 27.007
+CLCC_STATES = {
+    0: CallState.ANSWERED,
+    2: CallState.DIALING,
+    3: CallState.RINGING,
+    6: CallState.ENDED,
+}
+
+
+def parse_call_state(line: str) -> CallState | None:
+    """Map an unsolicited result code to the state of our outgoing call, None if unrelated."""
+    if line in CALL_END_CODES or line.startswith("^CEND"):
+        return CallState.ENDED
+
+    # Huawei vendor codes: ^ORIG call originated, ^CONF callee alerted, ^CONN call connected
+    if line.startswith("^ORIG"):
+        return CallState.DIALING
+    if line.startswith("^CONF"):
+        return CallState.RINGING
+    if line.startswith("^CONN"):
+        return CallState.ANSWERED
+
+    if (call := parse_clcc(line)) is not None and call.outgoing:
+        return CLCC_STATES.get(call.stat)
+
+    return None
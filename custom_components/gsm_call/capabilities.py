@@ -0,0 +1,94 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from homeassistant.core import HomeAssistant, callback
+
+from .at_response import PROMPT_RESULTS, FinalResult
+from .const import _LOGGER
+from .modem import Modem
+from .record_store import RecordStore, async_get_record_store
+
+# Manufacturers whose modems take AT+CMGS while a voice call is placed or active
+SMS_DURING_CALL_MANUFACTURERS = ("HUAWEI",)
+
+
+@dataclass
+class ModemCapabilities:
+    imei: str | None
+    manufacturer: str = ""
+    model: str = ""
+    revision: str = ""
+    # Whether AT+CLCC=1 is accepted, so call state changes are reported without polling
+    call_reports: bool = False
+    # Whether AT+CMGS sends its "> " prompt, otherwise senders pause for a fixed time instead
+    sms_prompt: bool = True
+    # Whether AT+CMGF=0 is supported
+    pdu_mode: bool = False
+
+    @property
+    def identity(self) -> str:
+        """Manufacturer and model, matched against the modem profiles with hardware: auto."""
+        return f"{self.manufacturer} {self.model}".upper()
+
+    @property
+    def sms_during_call(self) -> bool:
+        return any(name in self.manufacturer.upper() for name in SMS_DURING_CALL_MANUFACTURERS)
+
+
+async def async_read_imei(modem: Modem) -> str | None:
+    response = await modem.request("AT+CGSN", timeout=2)
+    # Either the bare IMEI or +CGSN: "<imei>" depending on the firmware
+    for line in response.lines:
+        imei = line.removeprefix("+CGSN:").strip().strip('"')
+        if imei.isdigit():
+            return imei
+    return None
+
+
+async def async_probe(modem: Modem, imei: str | None) -> ModemCapabilities:
+    """Identify the modem and test the features the dialers and SMS senders rely on."""
+
+    async def _info(command: str) -> str:
+        response = await modem.request(command, timeout=2)
+        return " ".join(line.split(":", 1)[-1].strip() for line in response.lines) if response.ok else ""
+
+    manufacturer = await _info("AT+CGMI")
+    if not manufacturer:
+        # Older firmware only identifies itself through ATI
+        manufacturer = await _info("ATI")
+
+    capabilities = ModemCapabilities(
+        imei=imei,
+        manufacturer=manufacturer,
+        model=await _info("AT+CGMM"),
+        revision=await _info("AT+CGMR"),
+        call_reports=await modem.setup("AT+CLCC=1"),
+    )
+
+    # +CMGF: (0,1) or (0-1)
+    formats = await _info("AT+CMGF=?")
+    capabilities.pdu_mode = "0" in formats
+
+    # Start a submit and abort it with Escape once the prompt shows up, nothing is sent
+    if await modem.setup("AT+CMGF=0" if capabilities.pdu_mode else "AT+CMGF=1"):
+        command = "AT+CMGS=10" if capabilities.pdu_mode else 'AT+CMGS="0"'
+        response = await modem.request(command, timeout=5, end_markers=PROMPT_RESULTS, prompt=">")
+        capabilities.sms_prompt = response.result == FinalResult.PROMPT
+        await modem.reset()
+
+    _LOGGER.info(f"Probed modem capabilities: {capabilities}")
+    return capabilities
+
+
+# Probed capabilities of every modem seen so far, stored by IMEI so a restart doesn't probe again
+CapabilityCache = RecordStore[ModemCapabilities]
+
+
+@callback
+def async_get_capability_cache(hass: HomeAssistant) -> CapabilityCache:
+    return async_get_record_store(hass, "capabilities", ModemCapabilities)
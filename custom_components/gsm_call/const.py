@@ -3,21 +3,68 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import logging
-from enum import Enum
+from enum import Enum, IntEnum
 
 _LOGGER = logging.getLogger(__name__)
 
 DOMAIN = "gsm_call"
 
 CONF_TYPE = "type"
+CONF_DEVICES = "devices"
 CONF_AT_COMMAND = "at_command"
 CONF_DIAL_TIMEOUT_SEC = "dial_timeout_sec"
 CONF_CALL_DURATION_SEC = "call_duration_sec"
 CONF_HARDWARE = "hardware"
+CONF_SMS_MODE = "sms_mode"
+CONF_CALL_STRATEGY = "call_strategy"
+CONF_PARALLEL_CALLS = "parallel_calls"
+CONF_CALL_ROUNDS = "call_rounds"
+CONF_MAX_ESCALATION_SEC = "max_escalation_sec"
+CONF_RATE_LIMIT = "rate_limit"
+CONF_PER_TARGET = "per_target"
+CONF_PER_MODEM = "per_modem"
+CONF_PERIOD_SEC = "period_sec"
+CONF_DEDUP_WINDOW_SEC = "dedup_window_sec"
+CONF_MAX_ATTEMPTS = "max_attempts"
+CONF_DELIVERY_REPORTS = "delivery_reports"
+CONF_INBOUND = "inbound"
+CONF_SERIAL = "serial"
+CONF_BAUDRATE = "baudrate"
+CONF_RTSCTS = "rtscts"
+CONF_DSRDTR = "dsrdtr"
+CONF_PROFILES = "profiles"
+CONF_DIAL_COMMAND = "dial_command"
+CONF_INIT_COMMANDS = "init_commands"
+CONF_HANGUP_COMMANDS = "hangup_commands"
+CONF_HANGUP_DELAY_SEC = "hangup_delay_sec"
+CONF_CALL_STATE_URCS = "call_state_urcs"
+CONF_MANUFACTURERS = "manufacturers"
+
+SERVICE_CANCEL = "cancel"
 
 EVENT_GSM_CALL_ENDED = f"{DOMAIN}_ended"
+EVENT_GSM_SMS_SENT = f"{DOMAIN}_sms_sent"
+EVENT_GSM_SMS_DELIVERED = f"{DOMAIN}_sms_delivered"
+EVENT_GSM_SMS_DELIVERY_FAILED = f"{DOMAIN}_sms_delivery_failed"
+EVENT_GSM_SMS_RECEIVED = f"{DOMAIN}_sms_received"
+EVENT_GSM_INCOMING_CALL = f"{DOMAIN}_incoming_call"
 ATTR_PHONE_NUMBER = "phone_number"
 ATTR_REASON = "reason"
+ATTR_ERROR = "error"
+ATTR_PRIORITY = "priority"
+ATTR_STRATEGY = "strategy"
+ATTR_ROUND = "round"
+ATTR_STEP = "step"
+ATTR_IDEMPOTENCY_KEY = "idempotency_key"
+ATTR_STATUS = "status"
+ATTR_LATENCY_SEC = "latency_sec"
+ATTR_PARTS = "parts"
+ATTR_MESSAGE = "message"
+ATTR_TIMESTAMP = "timestamp"
+ATTR_DEVICE = "device"
+
+# New SMS stored and announced with +CMTI, status reports forwarded as +CDS
+AT_MESSAGE_INDICATIONS = "AT+CNMI=2,1,0,1,0"
 
 # GSM 7-bit alphabet (basic chars, digits, common symbols)
 GSM_7BIT_ALPHABET = r'^[A-Za-z0-9 \t\n.,!?()"\'@#$%^&*-_=+;:<>\£\€\¥\§\¿\¡]+$'
@@ -27,3 +74,24 @@ class EndedReason(str, Enum):
     NOT_ANSWERED = "not_answered"
     DECLINED = "declined"
     ANSWERED = "answered"
+    CANCELLED = "cancelled"
+
+
+class CallStrategy(str, Enum):
+    # Call every target, one after the other
+    ALL = "all"
+    # Call targets in groups of parallel_calls and stop as soon as one answers
+    FIRST_ANSWER = "first_answer"
+
+
+class SmsResult(str, Enum):
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class Priority(IntEnum):
+    """Dispatch priority of a queued job, lower values go out first."""
+    CRITICAL = 0
+    HIGH = 1
+    NORMAL = 2
+    LOW = 3
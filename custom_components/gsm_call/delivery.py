@@ -0,0 +1,162 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from homeassistant.core import HomeAssistant, callback
+
+from .at_response import StatusReport, parse_cds
+from .const import (_LOGGER, ATTR_LATENCY_SEC, ATTR_PARTS, ATTR_PHONE_NUMBER,
+                    ATTR_STATUS, EVENT_GSM_SMS_DELIVERED,
+                    EVENT_GSM_SMS_DELIVERY_FAILED)
+from .metrics import ModemMetrics
+from .sms.pdu import decode_status_report
+
+# Messages without a status report after this long are forgotten, the default validity period is 4 days
+DELIVERY_REPORT_TTL_SEC = 4 * 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class DeliveryResult:
+    phone_number: str
+    delivered: bool
+    # TP-Status of the report which settled the message
+    status: int
+    # From the submission of the first part to the report settling the message
+    latency_sec: float
+    parts: int
+
+
+# Called with the outcome of every message once the SMSC has reported on all of its parts
+DeliveryListener = Callable[[DeliveryResult], None]
+
+
+@dataclass
+class _Outstanding:
+    phone_number: str
+    submitted_at: float
+    parts: int
+    # References of the parts sent but not reported yet
+    references: set[int] = field(default_factory=set)
+    delivered: int = 0
+    settled: bool = False
+
+
+class DeliveryTracker:
+    """Matches the +CDS status reports of a modem to the SMS it sent, by message reference."""
+
+    def __init__(self, metrics: ModemMetrics | None = None, ttl_sec: float = DELIVERY_REPORT_TTL_SEC):
+        self.metrics = metrics
+        self.ttl_sec = ttl_sec
+        # In submission order, so the expired messages are the first ones
+        self._by_reference: dict[int, _Outstanding] = {}
+        self._listeners: list[DeliveryListener] = []
+
+    @property
+    def outstanding(self) -> int:
+        """Number of message parts still waiting for their status report."""
+        return len(self._by_reference)
+
+    def subscribe(self, listener: DeliveryListener) -> Callable[[], None]:
+        """Call the listener with every delivery result, returns a function removing it."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def expect(self, phone_number: str, parts: int) -> Callable[[int], None]:
+        """Start tracking a message, returns the function to call with the +CMGS reference of each part sent.
+
+        References are added as soon as each part is accepted, since the report of the first part
+        may come back while the next one is still being sent.
+        """
+        self._evict()
+        outstanding = _Outstanding(phone_number, time.monotonic(), parts)
+
+        def _add_reference(reference: int) -> None:
+            if outstanding.settled:
+                return
+            # References wrap around after 255, an older message with the same one is long gone
+            self._by_reference.pop(reference, None)
+            self._by_reference[reference] = outstanding
+            outstanding.references.add(reference)
+
+        return _add_reference
+
+    def handle_urc(self, line: str) -> None:
+        if not line.startswith("+CDS:"):
+            return
+
+        header, _, pdu = line.partition("\n")
+        report = decode_status_report(pdu) if pdu else parse_cds(header)
+        if report is None:
+            _LOGGER.warning(f"Unreadable status report: {line}")
+            return
+
+        self._evict()
+        outstanding = self._by_reference.get(report.reference)
+        if outstanding is None or not _same_number(report, outstanding.phone_number):
+            _LOGGER.debug(f"Status report for an unknown message: {report}")
+            return
+
+        if report.pending:
+            _LOGGER.debug(f"SMSC still trying to deliver to +{outstanding.phone_number}: {report}")
+            return
+
+        del self._by_reference[report.reference]
+        outstanding.references.discard(report.reference)
+        if report.delivered:
+            outstanding.delivered += 1
+            if outstanding.delivered < outstanding.parts:
+                return
+        else:
+            # A single lost part is enough for the message to be lost
+            for reference in outstanding.references:
+                self._by_reference.pop(reference, None)
+        outstanding.settled = True
+
+        latency_sec = time.monotonic() - outstanding.submitted_at
+        if report.delivered and self.metrics is not None:
+            self.metrics.record_phase("sms_delivery", latency_sec)
+
+        result = DeliveryResult(
+            outstanding.phone_number, report.delivered, report.status, latency_sec, outstanding.parts
+        )
+        _LOGGER.info(
+            f"SMS to +{result.phone_number} {'delivered' if result.delivered else 'not delivered'}"
+            f" after {latency_sec:.1f}s (status {report.status})"
+        )
+        for listener in list(self._listeners):
+            listener(result)
+
+    def _evict(self) -> None:
+        expired_before = time.monotonic() - self.ttl_sec
+        while self._by_reference:
+            reference, outstanding = next(iter(self._by_reference.items()))
+            if outstanding.submitted_at >= expired_before:
+                break
+            del self._by_reference[reference]
+            _LOGGER.debug(f"No status report for the SMS to +{outstanding.phone_number}, giving up")
+
+
+def _same_number(report: StatusReport, phone_number: str) -> bool:
+    # The SMSC may report the number in national format, compare the subscriber part only
+    if report.recipient is None:
+        return True
+    return report.recipient.lstrip("+")[-9:] == phone_number.lstrip("+")[-9:]
+
+
+@callback
+def async_fire_delivery_event(hass: HomeAssistant, result: DeliveryResult) -> None:
+    hass.bus.async_fire(
+        EVENT_GSM_SMS_DELIVERED if result.delivered else EVENT_GSM_SMS_DELIVERY_FAILED,
+        {
+            ATTR_PHONE_NUMBER: result.phone_number,
+            ATTR_STATUS: result.status,
+            ATTR_LATENCY_SEC: round(result.latency_sec, 3),
+            ATTR_PARTS: result.parts,
+        },
+    )
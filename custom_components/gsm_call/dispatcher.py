@@ -0,0 +1,457 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+import itertools
+import math
+from collections.abc import Awaitable, Callable, Collection, Hashable
+from dataclasses import dataclass, field
+from typing import Any
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+
+from .const import _LOGGER, DOMAIN, Priority
+from .modem import Modem
+from .session import ModemSession, async_get_session
+
+DEFAULT_MAX_BACKLOG = 100
+# How often a worker of an unhealthy modem checks whether it may take jobs again
+UNHEALTHY_RECHECK_SEC = 5
+
+# Gets one or, for batchable jobs, several jobs and returns one result or exception per job
+JobHandler = Callable[[Modem, list["Job"]], Awaitable[list[Any]]]
+
+
+@dataclass(eq=False)
+class Job:
+    priority: Priority
+    target: str
+    message: str
+    handler: JobHandler
+    enqueued_at: float
+    future: aio.Future = field(repr=False)
+    batchable: bool = False
+    # Extra data for the handler, not part of the deduplication key
+    attributes: dict[str, Any] = field(default_factory=dict)
+    # Whether the job may run on a modem in the middle of a voice call, if the modem supports it
+    during_call: bool = False
+    # The modems of the service which queued the job, the only ones it may run on
+    pool: tuple[ModemSession, ...] = ()
+    seq: int = 0
+    task: aio.Task | None = field(default=None, repr=False)
+
+    @property
+    def key(self) -> Hashable:
+        return self.handler, self.target, self.message
+
+
+class DispatchQueue:
+    """Priority queue of jobs shared by every modem, each running one job at a time.
+
+    Services with overlapping pools of modems queue their jobs here alike, so every modem still
+    has a single worker taking the most urgent job among those of all the pools it belongs to.
+    """
+
+    def __init__(self, hass: HomeAssistant, max_backlog: int = DEFAULT_MAX_BACKLOG):
+        self.hass = hass
+        self.max_backlog = max_backlog
+        self.last_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+        self._pending: dict[Hashable, Job] = {}
+        self._running: set[Job] = set()
+        self._seq = itertools.count()
+        self._changed = aio.Condition()
+        self._workers: dict[ModemSession, aio.Task] = {}
+        self._busy: set[ModemSession] = set()
+        self._waking: aio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting for a modem."""
+        return len(self._pending)
+
+    async def enqueue(
+            self, pool: tuple[ModemSession, ...], handler: JobHandler, target: str, message: str,
+            priority: Priority, batchable: bool = False, attributes: dict[str, Any] | None = None,
+            during_call: bool = False,
+    ) -> aio.Future:
+        """Queue a job for one of the modems of the pool and return a future resolving to the handler's result.
+
+        A job identical to one that is still pending is merged into it rather than queued twice.
+        Batchable jobs with the same handler, message and priority are handed to the handler together.
+        Jobs allowed during a call may share a modem with the call job holding it.
+        Waits for room when the backlog is full instead of dropping the job.
+        A duplicate queued from another pool keeps the pool of the pending job.
+        """
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: (handler, target, message) in self._pending or len(self._pending) < self.max_backlog
+            )
+
+            if job := self._pending.get((handler, target, message)):
+                _LOGGER.debug(f"Merging duplicate job for {target} into the pending one")
+                if priority < job.priority:
+                    job.priority = priority
+                    self._changed.notify_all()
+                return job.future
+
+            loop = aio.get_running_loop()
+            job = Job(
+                priority, target, message, handler, loop.time(), loop.create_future(), batchable, attributes or {},
+                during_call=during_call, pool=pool, seq=next(self._seq),
+            )
+            self._pending[job.key] = job
+            self._changed.notify_all()
+            _LOGGER.debug(f"Queued {priority.name} job for {target}, queue depth is {self.depth}")
+
+        for session in pool:
+            if (worker := self._workers.get(session)) is None or worker.done():
+                self._workers[session] = self.hass.async_create_background_task(
+                    self._run(session), name=f"{DOMAIN} dispatcher for {session.device_path}"
+                )
+
+        return job.future
+
+    @callback
+    def cancel(self, future: aio.Future) -> bool:
+        """Cancel the job behind a future returned by enqueue, whether still queued or already running."""
+        for job in self._pending.values():
+            if job.future is future:
+                self._drop(job)
+                return True
+
+        for job in self._running:
+            if job.future is future and job.task is not None:
+                job.task.cancel()
+                return True
+
+        return False
+
+    @callback
+    def cancel_targets(self, targets: Collection[str] | None = None) -> int:
+        """Cancel the queued and running jobs for the targets, or all jobs, returns how many were cancelled.
+
+        A batch also serving other targets goes on, only the futures of the targets are cancelled:
+        the handler skips the targets whose future is cancelled by the time their turn comes.
+        """
+        cancelled = 0
+        for job in list(self._pending.values()):
+            if targets is None or job.target in targets:
+                self._drop(job)
+                cancelled += 1
+
+        batches: dict[aio.Task, list[Job]] = {}
+        for job in self._running:
+            if job.task is not None:
+                batches.setdefault(job.task, []).append(job)
+        for task, jobs in batches.items():
+            matched = [job for job in jobs if targets is None or job.target in targets]
+            if len(matched) == len(jobs):
+                task.cancel()
+            else:
+                for job in matched:
+                    job.future.cancel()
+            cancelled += len(matched)
+
+        return cancelled
+
+    def _drop(self, job: Job) -> None:
+        del self._pending[job.key]
+        job.future.cancel()
+        self._wake()
+
+    @callback
+    def _wake(self) -> None:
+        """Notify the waiters of a change made from a callback, which can't take the lock itself."""
+        if self._waking is None:
+            self._waking = self.hass.async_create_background_task(self._notify(), name=f"{DOMAIN} dispatcher wakeup")
+
+    async def _notify(self) -> None:
+        try:
+            async with self._changed:
+                self._changed.notify_all()
+        finally:
+            self._waking = None
+
+    async def stop(self) -> None:
+        """Cancel the workers and every job still waiting for a modem."""
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+
+        for job in self._pending.values():
+            job.future.cancel()
+        self._pending.clear()
+
+    def _eligible(self, session: ModemSession, job: Job, during_call: bool) -> bool:
+        if session not in job.pool or (during_call and not job.during_call):
+            return False
+        # Leave the job to the healthy modems of its pool, unless none is left
+        return during_call or session.healthy or not any(other.healthy for other in job.pool)
+
+    async def _next_jobs(self, session: ModemSession, limit: int | None = None, during_call: bool = False) -> list[Job]:
+        """Take the session's next job with the similar ones to batch with it.
+
+        Only the jobs allowed during a call are taken if asked, on modems busy with one.
+        """
+        async with self._changed:
+            while True:
+                # The backlog is bounded and small, a scan is cheaper than keeping a heap per modem
+                eligible = [job for job in self._pending.values() if self._eligible(session, job, during_call)]
+                if eligible:
+                    break
+                if any(session in job.pool for job in self._pending.values()):
+                    # Only held back by the health of the modems, which changes without notice
+                    try:
+                        await aio.wait_for(self._changed.wait(), UNHEALTHY_RECHECK_SEC)
+                    except aio.TimeoutError:
+                        pass
+                else:
+                    await self._changed.wait()
+
+            job = min(eligible, key=lambda job: (job.priority, job.seq))
+            jobs = [job]
+            if job.batchable:
+                similar = [
+                    other for other in eligible
+                    if other is not job and other.batchable and other.handler == job.handler
+                    and other.message == job.message and other.priority == job.priority
+                ]
+                # Leave a fair share to the other free modems so a batch fans out across the pool
+                free_workers = sum(1 for other in job.pool if other.healthy and other not in self._busy)
+                share = math.ceil((len(similar) + 1) / max(free_workers, 1))
+                if limit is not None:
+                    share = min(share, limit)
+                jobs += similar[:share - 1]
+
+            for started in jobs:
+                del self._pending[started.key]
+            if not during_call:
+                self._busy.add(session)
+            self._changed.notify_all()
+            return jobs
+
+    async def _requeue(self, jobs: list[Job], worker: ModemSession | None = None) -> None:
+        """Give jobs taken by _next_jobs back to the queue, the worker giving them up being free again."""
+        async with self._changed:
+            self._busy.discard(worker)
+            for job in jobs:
+                if job.future.done():
+                    continue
+                if (duplicate := self._pending.get(job.key)) is not None:
+                    # Queued again in the meantime: resolve both with the pending one's result
+                    duplicate.future.add_done_callback(lambda done, job=job: _copy_result(done, job.future))
+                    continue
+                self._pending[job.key] = job
+            self._changed.notify_all()
+
+    async def _run(self, session: ModemSession) -> None:
+        while True:
+            limit = None
+            if (rate_limit := session.rate_limit) is not None and (limit := rate_limit.available()) < 1:
+                delay = rate_limit.delay()
+                _LOGGER.debug(f"Rate limit of {session.device_path} reached, waiting {delay:.1f}s")
+                # Checked again after the sleep, which may end a little early
+                await aio.sleep(delay)
+                continue
+
+            jobs = await self._next_jobs(session, limit)
+            if rate_limit is not None and not rate_limit.take(len(jobs)):
+                # The jobs run during a call spent the tokens in the meantime
+                await self._requeue(jobs, session)
+                continue
+
+            self._record_wait(session, jobs)
+            _LOGGER.debug(
+                f"Dispatching {jobs[0].priority.name} job for {', '.join(job.target for job in jobs)} "
+                f"to {session.device_path} after waiting {self.last_wait_sec:.1f}s, {self.depth} job(s) still queued"
+            )
+
+            if (
+                not session.health.reachable and not await session.refresh_health()
+                and any(other.healthy for other in jobs[0].pool)
+            ):
+                _LOGGER.debug(f"Handing the jobs of {session.device_path} over to the other modems")
+                await self._requeue(jobs, session)
+                continue
+
+            self._running.update(jobs)
+            try:
+                if not session.health.reachable:
+                    # No modem can reach the network: fail now rather than after the dial timeouts
+                    raise HomeAssistantError(f"{session.device_path} can't be used: {session.health.problem}")
+
+                async with session.acquire() as modem:
+                    task = self._start(modem, jobs)
+                    sharing = None
+                    if modem.capabilities is not None and modem.capabilities.sms_during_call:
+                        sharing = aio.ensure_future(self._run_during_call(session, modem, task))
+                    try:
+                        results = await task
+                    finally:
+                        if sharing is not None:
+                            if aio.current_task().cancelling():
+                                sharing.cancel()
+                            # The modem is released once the jobs started during the call are done too
+                            await aio.wait([sharing])
+            except aio.CancelledError:
+                if aio.current_task().cancelling():
+                    for job in jobs:
+                        job.future.cancel()
+                    raise
+                results = [aio.CancelledError()] * len(jobs)
+            except Exception as e:
+                results = [e] * len(jobs)
+            finally:
+                self._busy.discard(session)
+                self._running.difference_update(jobs)
+
+            self._settle(session, jobs, results)
+
+    async def _run_during_call(self, session: ModemSession, modem: Modem, call: aio.Task) -> None:
+        """Run the jobs allowed during a voice call on the modem busy with one, until the call's job is done."""
+        while not call.done():
+            if not modem.call_active.is_set():
+                await _unless_done(modem.call_active.wait(), call)
+                continue
+
+            limit = None
+            if (rate_limit := session.rate_limit) is not None and (limit := rate_limit.available()) < 1:
+                await _unless_done(aio.sleep(rate_limit.delay()), call)
+                continue
+
+            if (jobs := await _unless_done(self._next_jobs(session, limit, during_call=True), call)) is None:
+                continue
+            if rate_limit is not None and not rate_limit.take(len(jobs)):
+                await self._requeue(jobs)
+                continue
+
+            _LOGGER.debug(f"Running the job for {', '.join(job.target for job in jobs)} during the call")
+            self._record_wait(session, jobs)
+
+            self._running.update(jobs)
+            try:
+                results = await self._start(modem, jobs)
+            except aio.CancelledError:
+                if aio.current_task().cancelling():
+                    for job in jobs:
+                        job.future.cancel()
+                    raise
+                results = [aio.CancelledError()] * len(jobs)
+            except Exception as e:
+                results = [e] * len(jobs)
+            finally:
+                self._running.difference_update(jobs)
+
+            self._settle(session, jobs, results)
+
+    def _record_wait(self, session: ModemSession, jobs: list[Job]) -> None:
+        now = aio.get_running_loop().time()
+        self.last_wait_sec = max(now - job.enqueued_at for job in jobs)
+        self.max_wait_sec = max(self.max_wait_sec, self.last_wait_sec)
+        for job in jobs:
+            session.metrics.record_phase("queue_wait", now - job.enqueued_at)
+
+    @staticmethod
+    def _start(modem: Modem, jobs: list[Job]) -> aio.Task:
+        # A task of its own, so a single job can be cancelled without stopping the worker
+        task = aio.ensure_future(jobs[0].handler(modem, jobs))
+        for job in jobs:
+            job.task = task
+        return task
+
+    def _settle(self, session: ModemSession, jobs: list[Job], results: list[Any]) -> None:
+        """Resolve the futures of the jobs and record their outcome on the session."""
+        # From enqueue to result, the end-to-end time the caller of the service sees for one target
+        now = aio.get_running_loop().time()
+        for job, result in zip(jobs, results):
+            session.metrics.record_phase("notification", now - job.enqueued_at)
+            if job.future.done():
+                continue
+            if isinstance(result, aio.CancelledError):
+                job.future.cancel()
+            elif isinstance(result, Exception):
+                job.future.set_exception(result)
+            else:
+                job.future.set_result(result)
+
+        if all(isinstance(result, Exception) for result in results):
+            session.record_failure()
+            if session.health.reachable:
+                # Tells a network problem apart from a failed job, for the next jobs to fail over or fast.
+                # In the background, reconnecting may wait out a backoff the callers have no reason to.
+                self.hass.async_create_background_task(
+                    session.refresh_health(), name=f"{DOMAIN} health check of {session.device_path}"
+                )
+        else:
+            session.record_success()
+
+
+async def _unless_done(awaitable: Awaitable[Any], task: aio.Task) -> Any:
+    """Await unless the task finishes first, returns None in that case."""
+    waiter = aio.ensure_future(awaitable)
+    await aio.wait([waiter, task], return_when=aio.FIRST_COMPLETED)
+    if not waiter.done():
+        waiter.cancel()
+        await aio.wait([waiter])
+    # Cancelled late, it may have completed anyway
+    return None if waiter.cancelled() else waiter.result()
+
+
+def _copy_result(source: aio.Future, target: aio.Future) -> None:
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif (error := source.exception()) is not None:
+        target.set_exception(error)
+    else:
+        target.set_result(source.result())
+
+
+class ModemDispatcher:
+    """The shared dispatch queue as seen by the services using one pool of modems."""
+
+    def __init__(self, queue: DispatchQueue, sessions: list[ModemSession]):
+        self.queue = queue
+        self.sessions = sessions
+        self._pool = tuple(sessions)
+
+    async def enqueue(
+            self, handler: JobHandler, target: str, message: str, priority: Priority, batchable: bool = False,
+            attributes: dict[str, Any] | None = None, during_call: bool = False,
+    ) -> aio.Future:
+        return await self.queue.enqueue(
+            self._pool, handler, target, message, priority, batchable, attributes, during_call
+        )
+
+    @callback
+    def cancel(self, future: aio.Future) -> bool:
+        return self.queue.cancel(future)
+
+
+@callback
+def async_get_queue(hass: HomeAssistant) -> DispatchQueue:
+    """Return the dispatch queue shared by every modem, creating it on first use."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (queue := data.get("queue")) is None:
+        queue = data["queue"] = DispatchQueue(hass)
+
+        async def _stop_queue(_event: Event) -> None:
+            await queue.stop()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _stop_queue)
+
+    return queue
+
+
+@callback
+def async_get_dispatcher(hass: HomeAssistant, device_paths: list[str]) -> ModemDispatcher:
+    """Return the dispatcher for the pool of devices, queueing into the queue shared by every modem."""
+    sessions = [async_get_session(hass, device_path) for device_path in device_paths]
+    return ModemDispatcher(async_get_queue(hass), sessions)
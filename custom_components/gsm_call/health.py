@@ -0,0 +1,87 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+from dataclasses import dataclass
+
+from .at_response import parse_csq, parse_registration
+from .modem import Modem
+
+# How often the background monitor refreshes the snapshot of an idle modem
+HEALTH_CHECK_INTERVAL_SEC = 60
+
+# <stat> of +CREG/+CEREG, see 3GPP TS 27.007
+REGISTRATION_STATES = {
+    0: "not_registered",
+    1: "home",
+    2: "searching",
+    3: "denied",
+    4: "unknown",
+    5: "roaming",
+}
+
+
+@dataclass(frozen=True)
+class HealthSnapshot:
+    """Last known state of a modem, None meaning not checked (yet)."""
+
+    checked_at: float | None = None
+    # Whether the modem answered AT
+    alive: bool | None = None
+    # Best <stat> of +CREG (circuit switched) and +CEREG (LTE)
+    registration: int | None = None
+    # <rssi> of +CSQ, 99 when unknown
+    rssi: int | None = None
+    error: str | None = None
+
+    @property
+    def registered(self) -> bool | None:
+        if self.registration is None:
+            return None
+        return self.registration in (1, 5)
+
+    @property
+    def reachable(self) -> bool:
+        """False only when the modem is known to be unable to place a call or send an SMS."""
+        return self.alive is not False and self.registered is not False
+
+    @property
+    def signal_dbm(self) -> int | None:
+        if self.rssi is None or self.rssi == 99:
+            return None
+        return -113 + 2 * self.rssi
+
+    @property
+    def problem(self) -> str | None:
+        if self.alive is False:
+            return self.error or "no reply to AT"
+        if self.registered is False:
+            return f"not registered on the network ({REGISTRATION_STATES.get(self.registration, self.registration)})"
+        return None
+
+
+async def async_read_health(modem: Modem) -> HealthSnapshot:
+    """Ping the modem, then read its network registration and signal quality."""
+    now = aio.get_running_loop().time()
+    if (ping := await modem.request("AT", timeout=2)).timed_out or not ping.ok:
+        return HealthSnapshot(checked_at=now, alive=False, error=f"no reply to AT: {ping}")
+
+    registration = None
+    for command, prefix in (("AT+CREG?", "+CREG:"), ("AT+CEREG?", "+CEREG:")):
+        response = await modem.request(command, timeout=2)
+        if (parsed := parse_registration(response.first(prefix) or "")) is None:
+            continue
+        registration = parsed.stat
+        if parsed.registered:
+            break
+
+    csq = parse_csq((await modem.request("AT+CSQ", timeout=2)).first("+CSQ:") or "")
+    return HealthSnapshot(
+        checked_at=now,
+        alive=True,
+        registration=registration,
+        rssi=csq.rssi if csq is not None else None,
+    )
@@ -0,0 +1,195 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+
+from .at_response import ListedMessage, parse_clip, parse_cmgl, parse_scts
+from .const import (_LOGGER, AT_MESSAGE_INDICATIONS, ATTR_DEVICE,
+                    ATTR_MESSAGE, ATTR_PHONE_NUMBER, ATTR_TIMESTAMP, DOMAIN,
+                    EVENT_GSM_INCOMING_CALL, EVENT_GSM_SMS_RECEIVED)
+from .modem import Modem
+from .session import ModemSession
+from .sms.pdu import DeliverPdu, decode_deliver_pdu
+
+# RING repeats every few seconds while a call is waiting, a longer silence means the next RING is another call
+RING_GAP_SEC = 10
+# The parts of a concatenated message still missing one after this long are given up
+PARTS_TTL_SEC = 24 * 60 * 60
+# AT+CMGD commands joined on one command line, within the modem's line length
+DELETES_PER_COMMAND = 20
+
+
+@dataclass
+class _PartialMessage:
+    first_seen_at: float
+    parts: dict[int, DeliverPdu] = field(default_factory=dict)
+
+
+class InboundMonitor:
+    """Turns the new message and incoming call notifications of a modem into Home Assistant events.
+
+    Messages are read in bulk with AT+CMGL once +CMTI reports a new one, and on every connection for
+    those received while Home Assistant wasn't listening, then deleted so the SIM never fills up.
+    """
+
+    def __init__(self, hass: HomeAssistant, session: ModemSession):
+        self.hass = hass
+        self.session = session
+        self._fetch_task: aio.Task | None = None
+        self._fetch_again = False
+        self._last_ring_at = 0.0
+        self._call_reported = False
+        self._caller_id = False
+        self._partial: dict[tuple[str, int], _PartialMessage] = {}
+
+    def start(self) -> None:
+        self.session.add_urc_listener(self.handle_urc)
+        self.session.add_connect_hook(self._on_connect)
+
+    async def _on_connect(self, modem: Modem) -> None:
+        self._caller_id = await modem.setup("AT+CLIP=1")
+        if not await modem.setup(AT_MESSAGE_INDICATIONS):
+            _LOGGER.warning(f"{self.session.device_path} rejected AT+CNMI, new SMS will only be read on reconnect")
+        # The session is still locked by the connection, the fetch waits for it
+        self.schedule_fetch()
+
+    @callback
+    def handle_urc(self, line: str) -> None:
+        if line.startswith("+CMTI:"):
+            self.schedule_fetch()
+        elif line == "RING" or line.startswith("+CRING:"):
+            now = time.monotonic()
+            if now - self._last_ring_at > RING_GAP_SEC:
+                self._call_reported = False
+            self._last_ring_at = now
+            if not self._caller_id:
+                self._report_call(None)
+        elif line.startswith("+CLIP:"):
+            self._report_call(parse_clip(line))
+
+    @callback
+    def schedule_fetch(self) -> None:
+        """Read the stored messages soon, a burst of +CMTI resulting in a single read."""
+        if self._fetch_task is not None and not self._fetch_task.done():
+            self._fetch_again = True
+            return
+        self._fetch_task = self.hass.async_create_background_task(
+            self._fetch_loop(), name=f"{DOMAIN} inbound SMS of {self.session.device_path}"
+        )
+
+    def _report_call(self, phone_number: str | None) -> None:
+        if self._call_reported:
+            return
+        self._call_reported = True
+        _LOGGER.info(f"Incoming call on {self.session.device_path} from {phone_number or 'a withheld number'}")
+        self.hass.bus.async_fire(
+            EVENT_GSM_INCOMING_CALL, {ATTR_PHONE_NUMBER: phone_number, ATTR_DEVICE: self.session.device_path}
+        )
+
+    async def _fetch_loop(self) -> None:
+        while True:
+            self._fetch_again = False
+            try:
+                async with self.session.acquire() as modem:
+                    await self._fetch(modem)
+            except (OSError, HomeAssistantError) as e:
+                _LOGGER.warning(f"Failed to read new SMS from {self.session.device_path}: {e}")
+                return
+            if not self._fetch_again:
+                return
+
+    async def _fetch(self, modem: Modem) -> None:
+        pdu_mode = modem.capabilities is not None and modem.capabilities.pdu_mode
+        # PDU mode is safer: a text mode message reading "OK" would end the listing
+        if not await modem.setup("AT+CMGF=0" if pdu_mode else "AT+CMGF=1"):
+            _LOGGER.warning("Message format might not be set, but continuing")
+
+        # Unread messages only, leaving what the SIM already held, drafts and sent messages alone
+        response = await modem.request("AT+CMGL=0" if pdu_mode else 'AT+CMGL="REC UNREAD"', timeout=10)
+        if not response.ok:
+            raise HomeAssistantError(f"Modem rejected AT+CMGL: {response}")
+
+        received = parse_cmgl(response.lines)
+        if not received:
+            return
+        _LOGGER.debug(f"Read {len(received)} SMS from {self.session.device_path}")
+        for message in received:
+            self._handle_message(self._decode(message, pdu_mode))
+        await self._delete(modem, [message.index for message in received])
+
+    @staticmethod
+    def _decode(message: ListedMessage, pdu_mode: bool) -> DeliverPdu | None:
+        if pdu_mode:
+            return decode_deliver_pdu(message.body)
+        # <stat>,<oa>,[<alpha>],<scts> where the comma inside <scts> splits it in two fields
+        if len(message.fields) < 2:
+            return None
+        timestamp = parse_scts(",".join(message.fields[3:5])) if len(message.fields) >= 5 else None
+        return DeliverPdu(sender=message.fields[1], text=message.body, timestamp=timestamp)
+
+    def _handle_message(self, message: DeliverPdu | None) -> None:
+        if message is None:
+            _LOGGER.warning(f"Unreadable SMS on {self.session.device_path}, deleting it")
+            return
+
+        if message.concat is not None:
+            reference, count, number = message.concat
+            now = time.monotonic()
+            self._partial = {k: p for k, p in self._partial.items() if now - p.first_seen_at < PARTS_TTL_SEC}
+            partial = self._partial.setdefault((message.sender, reference), _PartialMessage(now))
+            partial.parts[number] = message
+            if len(partial.parts) < count:
+                return
+            del self._partial[(message.sender, reference)]
+            parts = [partial.parts[n] for n in sorted(partial.parts)]
+            message = DeliverPdu(message.sender, "".join(p.text for p in parts), parts[0].timestamp)
+
+        _LOGGER.info(f"SMS received on {self.session.device_path} from {message.sender}")
+        self.hass.bus.async_fire(
+            EVENT_GSM_SMS_RECEIVED,
+            {
+                ATTR_PHONE_NUMBER: message.sender,
+                ATTR_MESSAGE: message.text,
+                ATTR_TIMESTAMP: _isoformat(message.timestamp),
+                ATTR_DEVICE: self.session.device_path,
+            },
+        )
+
+    async def _delete(self, modem: Modem, indexes: list[int]) -> None:
+        """Delete the messages with as few commands as possible, joining them on one command line."""
+        for start in range(0, len(indexes), DELETES_PER_COMMAND):
+            chunk = indexes[start:start + DELETES_PER_COMMAND]
+            command = "AT" + ";".join(f"+CMGD={index}" for index in chunk)
+            if (await modem.request(command, timeout=5 + len(chunk))).ok:
+                continue
+
+            # Some firmware doesn't take concatenated commands
+            _LOGGER.debug("Concatenated AT+CMGD rejected, deleting one message at a time")
+            for index in chunk:
+                if not (response := await modem.request(f"AT+CMGD={index}", timeout=5)).ok:
+                    _LOGGER.warning(f"Failed to delete SMS {index} from {self.session.device_path}: {response}")
+
+
+def _isoformat(timestamp: datetime | None) -> str | None:
+    return timestamp.isoformat() if timestamp is not None else None
+
+
+@callback
+def async_enable_inbound(hass: HomeAssistant, session: ModemSession) -> None:
+    """Publish the SMS and calls the session's modem receives as events, once per device."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (monitors := data.get("inbound")) is None:
+        monitors = data["inbound"] = {}
+
+    if session.device_path not in monitors:
+        monitors[session.device_path] = monitor = InboundMonitor(hass, session)
+        monitor.start()
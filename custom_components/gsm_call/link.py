@@ -0,0 +1,207 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+import itertools
+import statistics
+import time
+from dataclasses import dataclass
+
+import serial
+import serial_asyncio_fast as serial_asyncio
+from homeassistant.core import HomeAssistant, callback
+
+from .const import _LOGGER
+from .metrics import ModemMetrics
+from .modem import READ_LIMIT, Modem
+from .record_store import RecordStore, async_get_record_store
+
+# Settings the integration always used, kept as the default so existing setups behave the same
+DEFAULT_BAUDRATE = 75600
+# Tried in this order when the baud rate is auto, the first of equally fast settings winning
+CANDIDATE_BAUDRATES = (115200, 921600, 460800, 230400, 57600, 19200, 9600)
+SELF_TEST_ROUNDS = 10
+# Settings this much slower than the fastest are as good, round trips vary that much anyway
+LATENCY_TOLERANCE = 0.1
+# How long a candidate gets to answer AT before it is written off
+CANDIDATE_READY_SEC = 1
+
+
+@dataclass(frozen=True)
+class SerialSettings:
+    # None for auto: tried against the modem once, the best setting being kept
+    baudrate: int | None = DEFAULT_BAUDRATE
+    # None to try both with an auto baud rate, on otherwise
+    rtscts: bool | None = None
+    dsrdtr: bool | None = None
+
+    @property
+    def auto(self) -> bool:
+        return self.baudrate is None
+
+    def resolved(self) -> SerialSettings:
+        """Return the settings to open the port with when nothing needs to be tried."""
+        return SerialSettings(
+            self.baudrate or DEFAULT_BAUDRATE,
+            True if self.rtscts is None else self.rtscts,
+            True if self.dsrdtr is None else self.dsrdtr,
+        )
+
+    def candidates(self, preferred_baudrate: int | None = None) -> list[SerialSettings]:
+        """Return the settings worth trying, the most likely first."""
+        baudrates = [self.baudrate] if self.baudrate else list(CANDIDATE_BAUDRATES)
+        if preferred_baudrate:
+            baudrates = [preferred_baudrate] + [b for b in baudrates if b != preferred_baudrate]
+        rtscts = [True, False] if self.rtscts is None else [self.rtscts]
+        dsrdtr = [True, False] if self.dsrdtr is None else [self.dsrdtr]
+        return [SerialSettings(*candidate) for candidate in itertools.product(baudrates, rtscts, dsrdtr)]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.baudrate or 'auto'} baud, RTS/CTS {_on_off(self.rtscts)}, DSR/DTR {_on_off(self.dsrdtr)}"
+        )
+
+
+@dataclass(frozen=True)
+class SelfTestResult:
+    settings: SerialSettings
+    rounds: int
+    errors: int
+    # Median round trip of the commands answered correctly, None if none was
+    latency_sec: float | None
+
+    @property
+    def reliable(self) -> bool:
+        return self.errors == 0 and self.latency_sec is not None
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.rounds if self.rounds else 1.0
+
+
+async def async_open_modem(device_path: str, settings: SerialSettings, metrics: ModemMetrics | None = None) -> Modem:
+    """Open the serial port with the given settings, the modem isn't started yet."""
+    return Modem(
+        *await serial_asyncio.open_serial_connection(
+            url=device_path,
+            baudrate=settings.baudrate,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_ONE,
+            dsrdtr=settings.dsrdtr,
+            rtscts=settings.rtscts,
+            limit=READ_LIMIT,
+        ),
+        metrics=metrics,
+    )
+
+
+async def async_self_test(modem: Modem, settings: SerialSettings, rounds: int = SELF_TEST_ROUNDS) -> SelfTestResult:
+    """Exchange AT and ATI with the modem, counting the garbled or missing replies.
+
+    ATI replies with several lines which must come back the same every time: with a wrong
+    baud rate or flow control, characters get lost or mangled and the copies differ.
+    """
+    errors = 0
+    latencies = []
+    reference: list[str] | None = None
+    for i in range(rounds):
+        command = "ATI" if i % 2 else "AT"
+        start = time.monotonic()
+        response = await modem.request(command, timeout=1)
+        elapsed = time.monotonic() - start
+
+        if response.ok and command == "ATI":
+            if reference is None:
+                reference = response.lines
+            elif response.lines != reference:
+                errors += 1
+                continue
+        if not response.ok:
+            errors += 1
+            continue
+        latencies.append(elapsed)
+
+    return SelfTestResult(settings, rounds, errors, statistics.median(latencies) if latencies else None)
+
+
+async def async_tune(device_path: str, settings: SerialSettings) -> SelfTestResult | None:
+    """Self-test every candidate setting on the port, returns the fastest reliable one or None.
+
+    Once the modem answers, only the fixed rate it reports with AT+IPR? is tried further. Modems
+    set to autobaud follow whatever rate AT is sent at, and USB modems ignore the rate altogether.
+    """
+    _LOGGER.info(f"Testing serial settings for {device_path}, this may take a while...")
+    candidates = settings.candidates()
+    tested: list[SerialSettings] = []
+    results: list[SelfTestResult] = []
+    while candidates:
+        candidate = candidates.pop(0)
+        tested.append(candidate)
+        result, modem_rate = await _test_candidate(device_path, candidate)
+        if result is None:
+            continue
+        _LOGGER.debug(
+            f"{device_path} at {candidate}: {result.error_rate:.0%} errors, "
+            f"{(result.latency_sec or 0) * 1000:.0f}ms round trip"
+        )
+        results.append(result)
+        if modem_rate and settings.auto:
+            # No other rate can work on a modem with a fixed one
+            candidates = [
+                c for c in settings.candidates(modem_rate) if c.baudrate == modem_rate and c not in tested
+            ]
+
+    if not (reliable := [result for result in results if result.reliable]):
+        _LOGGER.warning(f"No serial setting tried on {device_path} worked reliably")
+        return None
+
+    fastest = min(result.latency_sec for result in reliable)
+    best = next(result for result in reliable if result.latency_sec <= fastest * (1 + LATENCY_TOLERANCE))
+    _LOGGER.info(f"Using {best.settings} for {device_path}, {best.latency_sec * 1000:.0f}ms round trip")
+    return best
+
+
+async def _test_candidate(device_path: str, settings: SerialSettings) -> tuple[SelfTestResult | None, int | None]:
+    """Return the self-test of one setting and the fixed rate the modem reports, if any."""
+    try:
+        modem = await async_open_modem(device_path, settings)
+    except OSError as e:
+        _LOGGER.debug(f"Can't open {device_path} at {settings}: {e}")
+        return None, None
+
+    modem.start()
+    try:
+        if not await modem.reset(timeout=CANDIDATE_READY_SEC):
+            return SelfTestResult(settings, 1, 1, None), None
+        result = await async_self_test(modem, settings)
+        response = await modem.request("AT+IPR?", timeout=1)
+        rate = (response.first("+IPR:") or "").removeprefix("+IPR:").strip()
+        # 0 stands for autobaud
+        return result, int(rate) if rate.isdigit() and int(rate) > 0 else None
+    except OSError as e:
+        _LOGGER.debug(f"{device_path} failed at {settings}: {e}")
+        return None, None
+    finally:
+        try:
+            await modem.close()
+        except OSError:
+            pass
+        # Let the port settle before it is opened with the next setting
+        await aio.sleep(.1)
+
+
+# Serial settings chosen by the self-test for every device, so it only runs once
+LinkCache = RecordStore[SerialSettings]
+
+
+def _on_off(value: bool | None) -> str:
+    return "auto" if value is None else "on" if value else "off"
+
+
+@callback
+def async_get_link_cache(hass: HomeAssistant) -> LinkCache:
+    return async_get_record_store(hass, "serial_link", SerialSettings)
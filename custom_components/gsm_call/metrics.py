@@ -0,0 +1,126 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import bisect
+import re
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Upper bounds of the latency histogram buckets, the last bucket is unbounded
+BUCKETS_SEC = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Uppercase AT and a command name ending where its arguments, a query, the next command or the line start,
+# so text sent after a prompt, like "Attention: ..." in an SMS, isn't taken for a command
+COMMAND_NAME = re.compile(r"AT(?:[+^%_!$][A-Za-z0-9]+(?=[=?;]|$)|DT?(?=[0-9+*#;>]|$)|[A-Z][0-9]*(?=[=?;]|$)|(?=$))")
+# What isn't a command, like the body of an SMS, is recorded under this name
+DATA_NAME = "<data>"
+
+# Called with (kind, name, seconds) for every recorded command or phase, kind being "command" or "phase"
+MetricsListener = Callable[[str, str, float], None]
+
+
+@dataclass
+class LatencyHistogram:
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(BUCKETS_SEC) + 1))
+    count: int = 0
+    total_sec: float = 0.0
+    max_sec: float = 0.0
+    last_sec: float = 0.0
+    timeouts: int = 0
+
+    def observe(self, seconds: float) -> None:
+        self.buckets[bisect.bisect_left(BUCKETS_SEC, seconds)] += 1
+        self.count += 1
+        self.total_sec += seconds
+        self.max_sec = max(self.max_sec, seconds)
+        self.last_sec = seconds
+
+    @property
+    def mean_sec(self) -> float:
+        return self.total_sec / self.count if self.count else 0.0
+
+    def percentile_sec(self, percentile: float) -> float:
+        """Upper bound of the bucket holding the percentile, the max for the unbounded bucket."""
+        rank = percentile / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_SEC, self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(bound, self.max_sec)
+        return self.max_sec
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "mean_ms": round(self.mean_sec * 1000),
+            "p95_ms": round(self.percentile_sec(95) * 1000),
+            "max_ms": round(self.max_sec * 1000),
+            "last_ms": round(self.last_sec * 1000),
+        }
+
+
+def command_name(command: str) -> str:
+    """Group commands by name, without arguments or dialed numbers: AT+CMGS="+40..." -> AT+CMGS."""
+    if match := COMMAND_NAME.match(command):
+        return match.group(0).upper()
+    return DATA_NAME
+
+
+class ModemMetrics:
+    """Timing of the AT commands and notification phases of one modem, plus bytes transferred."""
+
+    def __init__(self):
+        self.commands: dict[str, LatencyHistogram] = {}
+        self.phases: dict[str, LatencyHistogram] = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._listeners: list[MetricsListener] = []
+
+    @property
+    def timeouts(self) -> int:
+        return sum(histogram.timeouts for histogram in self.commands.values())
+
+    def subscribe(self, listener: MetricsListener) -> Callable[[], None]:
+        """Call the listener after every recorded command or phase, returns a function unsubscribing it."""
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+    def record_command(self, command: str, seconds: float, timed_out: bool = False, name: str | None = None) -> None:
+        name = name or command_name(command)
+        histogram = self.commands.setdefault(name, LatencyHistogram())
+        histogram.observe(seconds)
+        if timed_out:
+            histogram.timeouts += 1
+        self._notify("command", name, seconds)
+
+    def record_phase(self, name: str, seconds: float) -> None:
+        self.phases.setdefault(name, LatencyHistogram()).observe(seconds)
+        self._notify("phase", name, seconds)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the block as a phase of a notification: connect, dial, ring, hangup, sms_submit..."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.monotonic() - start)
+
+    def as_dict(self) -> dict:
+        return {
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "timeouts": self.timeouts,
+            "commands": {name: h.as_dict() for name, h in self.commands.items()},
+            "phases": {name: h.as_dict() for name, h in self.phases.items()},
+        }
+
+    def _notify(self, kind: str, name: str, seconds: float) -> None:
+        for listener in list(self._listeners):
+            listener(kind, name, seconds)
@@ -3,44 +3,260 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 import asyncio as aio
+import re
+import time
+from collections.abc import AsyncIterator, Callable, Iterable, Sequence
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
 
+from .at_response import CALL_END_CODES, FINAL_RESULTS, AtResponse, parse_response
 from .const import _LOGGER
+from .metrics import ModemMetrics
+
+if TYPE_CHECKING:
+    from .capabilities import ModemCapabilities
+    from .delivery import DeliveryTracker
 
 READ_LIMIT = 2**16  # 64 KiB
 
+# Unsolicited result codes, never part of a command response unless that command asked for them
+URC_PREFIXES = (
+    "RING", "+CRING", "+CLIP", "+CLCC", "+CMTI", "+CDS", "+CREG", "+CEREG",
+    "^CEND", "^CONN", "^ORIG", "^CONF", "^RSSI", "^BOOT", "^MODE", "^SRVST", "^SIMST",
+)
+# Unsolicited result codes followed by a line of their own, like the PDU after +CDS: <length> in PDU mode
+URC_WITH_BODY = re.compile(r"^\+CDS: *\d+$")
+LINE_SEPARATOR = re.compile(rb"[\r\n]")
+
+UrcListener = Callable[[str], None]
+
 
 class Modem:
     DEFAULT_EOL = "\r\n"
     SMS_TERMINATOR = "\r\x1A"
 
-    def __init__(self, reader: aio.StreamReader, writer: aio.StreamWriter):
+    def __init__(self, reader: aio.StreamReader, writer: aio.StreamWriter, metrics: ModemMetrics | None = None):
         self.reader = reader
         self.writer = writer
+        self.metrics = metrics or ModemMetrics()
+        # Set by the session once the modem has been identified
+        self.capabilities: "ModemCapabilities | None" = None
+        # Set by the session, collects the status reports of the SMS sent through this modem
+        self.delivery: "DeliveryTracker | None" = None
+        # Setting commands applied on this connection, by name: AT+CMGF -> ("AT+CMGF=1", accepted)
+        self._settings: dict[str, tuple[str, bool]] = {}
+        # Set by dialers from the moment a voice call is placed until it has been hung up
+        self.call_active = aio.Event()
+        # Serializes commands in arrival order, the holder being the task in the middle of a command sequence
+        self._command_lock = aio.Lock()
+        self._command_owner: aio.Task | None = None
+        self._command: str | None = None
+        self._prompt: bytes | None = None
+        self._responses: aio.Queue[str | None] = aio.Queue()
+        self._urc_listeners: list[UrcListener] = []
+        # The standard and Huawei URCs, plus the vendor ones of the modem profile once a dialer adds them
+        self._urc_prefixes = URC_PREFIXES
+        self._urc_header: str | None = None
+        self._reader_task: aio.Task | None = None
+
+    @property
+    def alive(self) -> bool:
+        """Return True while the port is open and the background reader is running."""
+        return (
+            self._reader_task is not None
+            and not self._reader_task.done()
+            and not self.writer.is_closing()
+        )
+
+    def start(self) -> None:
+        """Start reading the serial port in the background."""
+        self._reader_task = aio.get_running_loop().create_task(self._read_loop())
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    def add_urc_listener(self, listener: UrcListener) -> Callable[[], None]:
+        """Call the listener with every unsolicited line, returns a function removing it.
+
+        The URCs spanning two lines are passed as one, the lines separated by a newline.
+        """
+        self._urc_listeners.append(listener)
+        return lambda: self._urc_listeners.remove(listener)
+
+    def add_urc_prefixes(self, prefixes: Iterable[str]) -> None:
+        """Treat the lines starting with the prefixes as unsolicited too, like vendor call state reports."""
+        self._urc_prefixes += tuple(prefix for prefix in prefixes if prefix not in self._urc_prefixes)
+
+    @asynccontextmanager
+    async def exclusive(self) -> AsyncIterator[None]:
+        """Keep the commands of other tasks out until the block ends, like between AT+CMGS and the message.
+
+        Commands are exclusive on their own; waiters are served first come, first served, and a waiter
+        cancelled before its turn simply leaves the line.
+        """
+        if self._command_owner is aio.current_task():
+            yield
+            return
+
+        async with self._command_lock:
+            self._command_owner = aio.current_task()
+            try:
+                yield
+            finally:
+                self._command_owner = None
+
+    async def request(
+            self, command: str, timeout: float, end_markers: Sequence[str] = FINAL_RESULTS,
+            terminator: str = DEFAULT_EOL, prompt: str | None = None, record_as: str | None = None) -> AtResponse:
+        """Like execute_at, with the response split into informational lines and a typed final result."""
+        return parse_response(await self.execute_at(command, timeout, end_markers, terminator, prompt, record_as))
 
     async def execute_at(
-            self, command: str, timeout: float, end_markers: list[str], terminator: str = DEFAULT_EOL) -> list[str]:
-        self.send_command(command, terminator)
-        return await self._read_response(timeout, end_markers)
+            self, command: str, timeout: float, end_markers: Sequence[str] = FINAL_RESULTS,
+            terminator: str = DEFAULT_EOL, prompt: str | None = None, record_as: str | None = None) -> list[str]:
+        """Send a command and collect the response lines until one starts with an end marker.
+
+        A prompt, like the "> " of AT+CMGS, is returned as a line of its own as soon as it arrives,
+        even though the modem doesn't terminate it with a newline. The timing is recorded under
+        record_as rather than the command's name if given, for data like the body of an SMS.
+        """
+        end_markers = tuple(end_markers)
+        async with self.exclusive():
+            # Late replies to an earlier command which timed out must not be taken for this one's
+            while not self._responses.empty():
+                if (stale := self._responses.get_nowait()) is not None:
+                    _LOGGER.debug(f"Discarding stale line: {stale}")
+
+            self._command = command
+            self._prompt = prompt.encode() if prompt else None
+            start = time.monotonic()
+            try:
+                self.send_command(command, terminator)
+                lines = await self._read_response(timeout, end_markers)
+            finally:
+                self._command = None
+                self._prompt = None
+
+        # A response cut short by the timeout doesn't end with one of the markers
+        completed = bool(lines) and lines[-1].startswith(end_markers)
+        self.metrics.record_command(command, time.monotonic() - start, timed_out=not completed, name=record_as)
+        return lines
+
+    def applied(self, name: str) -> str | None:
+        """Return the command last applied by setup for a setting like AT+CSMP on this connection, if any."""
+        return applied[0] if (applied := self._settings.get(name.upper())) is not None else None
+
+    async def setup(self, command: str, timeout: float = 2) -> bool:
+        """Apply a setting like AT+CMGF=1 once per connection, returns whether the modem accepted it.
+
+        Sending it again is a no-op until another value of the same setting is applied.
+        """
+        name = command.split("=", 1)[0].upper()
+        if (applied := self._settings.get(name)) is not None and applied[0] == command:
+            return applied[1]
+
+        response = await self.request(command, timeout)
+        if not response.timed_out:
+            self._settings[name] = (command, response.ok)
+        _LOGGER.debug(f"Setting {command} {'accepted' if response.ok else 'rejected'}: {response}")
+        return response.ok
+
+    async def reset(self, timeout: float = 2) -> bool:
+        """Cancel any half-entered command with Escape and wait until the modem answers AT again.
+
+        Returns False if the modem didn't become ready within the timeout.
+        """
+        async with self.exclusive():
+            _LOGGER.debug("Clearing modem buffer with Escape (\x1B)")
+            self.send_command("\x1B", terminator="")
+
+            loop = aio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (remaining := deadline - loop.time()) > 0:
+                if (await self.request("AT", timeout=min(remaining, .5))).ok:
+                    return True
+
+        _LOGGER.debug(f"Modem not ready {timeout}s after reset")
+        return False
 
     def send_command(self, command: str, terminator: str = DEFAULT_EOL) -> None:
         _LOGGER.debug(f"Sending: {command}")
-        self.writer.write(f"{command}{terminator}".encode())
+        data = f"{command}{terminator}".encode()
+        self.writer.write(data)
+        self.metrics.bytes_written += len(data)
         # No await drain() needed here as it's synchronous, but for completeness:
         # await modem.writer.drain()  # Optional, as write is buffered
 
-    async def _read_response(self, timeout: float, end_markers: list[str]) -> list[str]:
+    async def _read_response(self, timeout: float, end_markers: tuple[str, ...]) -> list[str]:
         lines = []
         try:
             async with aio.timeout(timeout):
                 while True:
-                    line = await self.reader.readline()
-                    decoded = line.decode(errors='ignore').strip()
-                    if not decoded:
-                        continue
+                    decoded = await self._responses.get()
+                    if decoded is None:
+                        raise ConnectionError("Serial port closed while waiting for a response")
 
                     lines.append(decoded)
-                    if any(decoded == m or decoded.startswith(m) for m in end_markers):
+                    if decoded.startswith(end_markers):
                         return lines
         except TimeoutError:
-            _LOGGER.warn(f"Timeout occurred while reading response, returning {len(lines)} line(s) collected so far")
+            _LOGGER.warning(f"Timeout occurred while reading response, returning {len(lines)} line(s) collected so far")
             return lines
+
+    async def _read_loop(self) -> None:
+        buffer = b""
+        try:
+            while data := await self.reader.read(READ_LIMIT):
+                self.metrics.bytes_read += len(data)
+                *lines, buffer = LINE_SEPARATOR.split(buffer + data)
+                for line in lines:
+                    if decoded := line.decode(errors='ignore').strip():
+                        self._route_line(decoded)
+
+                # Prompts aren't followed by a newline, so they stay in the unterminated remainder
+                if self._prompt is not None and buffer.strip() == self._prompt:
+                    buffer = b""
+                    self._route_line(self._prompt.decode())
+            _LOGGER.warning("Modem closed the serial port")
+        except OSError as e:
+            _LOGGER.warning(f"Error reading from the modem: {e}")
+        finally:
+            # Wake up a pending _read_response so it doesn't wait for the timeout
+            self._responses.put_nowait(None)
+
+    def _route_line(self, line: str) -> None:
+        if self._urc_header is not None:
+            line, self._urc_header = f"{self._urc_header}\n{line}", None
+            self._notify_urc(line)
+            return
+
+        is_urc = self._is_urc(line)
+        is_call_end = line in CALL_END_CODES
+        if is_urc and URC_WITH_BODY.match(line):
+            self._urc_header = line
+            return
+
+        if self._command is not None and not is_urc:
+            self._responses.put_nowait(line)
+        elif not is_urc and not is_call_end:
+            _LOGGER.debug(f"Ignoring unexpected line: {line}")
+            return
+
+        if is_urc or is_call_end:
+            self._notify_urc(line)
+
+    def _notify_urc(self, line: str) -> None:
+        _LOGGER.debug(f"Unsolicited: {line}")
+        for listener in list(self._urc_listeners):
+            listener(line)
+
+    def _is_urc(self, line: str) -> bool:
+        if not line.startswith(self._urc_prefixes):
+            return False
+
+        # +CLCC is both an unsolicited report and the reply to AT+CLCC, likewise for +CREG etc.
+        prefix = line.split(":", 1)[0]
+        return not (self._command is not None and self._command.upper().startswith(f"AT{prefix}"))
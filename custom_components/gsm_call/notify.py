@@ -4,113 +4,303 @@
 
 from __future__ import annotations
 
+import asyncio as aio
 import re
 
 import homeassistant.helpers.config_validation as cv
-import serial
-import serial_asyncio_fast as serial_asyncio
 import voluptuous as vol
 from homeassistant.components.notify import \
     PLATFORM_SCHEMA as NOTIFY_PLATFORM_SCHEMA
-from homeassistant.components.notify.const import ATTR_TARGET
+from homeassistant.components.notify.const import ATTR_DATA, ATTR_TARGET
 from homeassistant.components.notify.legacy import BaseNotificationService
-from homeassistant.const import CONF_DEVICE
-from homeassistant.core import HomeAssistant
+from homeassistant.const import CONF_DEVICE, CONF_NAME
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 
-from custom_components.gsm_call.sms.sms_sender import SmsSender
-
-from .calls.at_dialer import ATDialer
-from .calls.at_tone_dialer import ATToneDialer
-from .calls.gtm382_dialer import GTM382Dialer
-from .calls.zte_dialer import ZTEDialer
-from .const import (_LOGGER, ATTR_PHONE_NUMBER, ATTR_REASON, CONF_AT_COMMAND,
-                    CONF_CALL_DURATION_SEC, CONF_DIAL_TIMEOUT_SEC,
-                    CONF_HARDWARE, CONF_TYPE, EVENT_GSM_CALL_ENDED,
-                    GSM_7BIT_ALPHABET)
-from .modem import READ_LIMIT, Modem
-
-# Hardware support configuration
-SUPPORTED_DIALERS = {
-    "atd": ATDialer,
-    "atdt": ATToneDialer,
-    "zte": ZTEDialer,
-    "gtm382": GTM382Dialer,
-}
+from .admission import AdmissionControl
+from .calls.call_state import CallState
+from .const import (_LOGGER, ATTR_ERROR, ATTR_IDEMPOTENCY_KEY,
+                    ATTR_PHONE_NUMBER, ATTR_PRIORITY, ATTR_REASON, ATTR_ROUND,
+                    ATTR_STEP, ATTR_STRATEGY, CONF_AT_COMMAND, CONF_BAUDRATE,
+                    CONF_CALL_DURATION_SEC, CONF_CALL_ROUNDS,
+                    CONF_CALL_STATE_URCS, CONF_CALL_STRATEGY,
+                    CONF_DEDUP_WINDOW_SEC, CONF_DELIVERY_REPORTS, CONF_DEVICES,
+                    CONF_DIAL_COMMAND, CONF_DIAL_TIMEOUT_SEC, CONF_DSRDTR,
+                    CONF_HANGUP_COMMANDS, CONF_HANGUP_DELAY_SEC, CONF_HARDWARE,
+                    CONF_INBOUND, CONF_INIT_COMMANDS, CONF_MANUFACTURERS,
+                    CONF_MAX_ATTEMPTS, CONF_MAX_ESCALATION_SEC,
+                    CONF_PARALLEL_CALLS, CONF_PER_MODEM, CONF_PER_TARGET,
+                    CONF_PERIOD_SEC, CONF_PROFILES, CONF_RATE_LIMIT,
+                    CONF_RTSCTS, CONF_SERIAL, CONF_SMS_MODE, CONF_TYPE, DOMAIN,
+                    EVENT_GSM_CALL_ENDED, EVENT_GSM_SMS_SENT,
+                    GSM_7BIT_ALPHABET, SERVICE_CANCEL, CallStrategy,
+                    EndedReason, Priority, SmsResult)
+from .dispatcher import (Job, JobHandler, ModemDispatcher,
+                         async_get_dispatcher, async_get_queue)
+from .inbound import async_enable_inbound
+from .link import DEFAULT_BAUDRATE, SerialSettings
+from .modem import Modem
+from .outbox import Outbox, OutboxEntry, async_get_outbox
+from .profiles import (AUTO_PROFILE, BUILTIN_PROFILES, DEFAULT_HANGUP_COMMANDS,
+                       SMS_SENDERS, ModemProfile, ProfileRegistry,
+                       async_get_profile_registry)
+from .sensor import async_load_sensors
+
+# A modem profile added in the configuration, see ModemProfile
+PROFILE_SCHEMA = vol.Schema({
+    vol.Optional(CONF_DIAL_COMMAND, default="ATD"): cv.string,
+    vol.Optional(CONF_INIT_COMMANDS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+    vol.Optional(CONF_HANGUP_COMMANDS, default=list(DEFAULT_HANGUP_COMMANDS)): vol.All(
+        cv.ensure_list, [cv.string], vol.Length(min=1)
+    ),
+    vol.Optional(CONF_HANGUP_DELAY_SEC, default=0): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    vol.Optional(CONF_CALL_STATE_URCS, default={}): {cv.string: vol.Coerce(CallState)},
+    vol.Optional(CONF_MANUFACTURERS, default=[]): vol.All(cv.ensure_list, [cv.string]),
+})
+
+
+def _known_hardware(config: ConfigType) -> ConfigType:
+    """Check the hardware is a built-in profile or one the same service adds."""
+    known = [AUTO_PROFILE, *(profile.name for profile in BUILTIN_PROFILES), *config[CONF_PROFILES]]
+    if config[CONF_HARDWARE] not in known:
+        raise vol.Invalid(f"expected one of: {', '.join(known)}", path=[CONF_HARDWARE])
+    return config
+
 
 # Platform schema
-PLATFORM_SCHEMA = NOTIFY_PLATFORM_SCHEMA.extend(
+PLATFORM_SCHEMA = vol.All(NOTIFY_PLATFORM_SCHEMA.extend(
     {
-        vol.Required(CONF_DEVICE): cv.isdevice,
-        vol.Optional(CONF_HARDWARE, default="atd"): vol.In(SUPPORTED_DIALERS.keys()),
+        # A single modem, or a pool of modems sharing the load
+        vol.Exclusive(CONF_DEVICE, "device"): cv.isdevice,
+        vol.Exclusive(CONF_DEVICES, "device"): vol.All(cv.ensure_list, [cv.isdevice], vol.Length(min=1)),
+        vol.Optional(CONF_HARDWARE, default=AUTO_PROFILE): cv.string,
+        # Modem profiles added to the built-in ones, for this service's hardware or for auto detection
+        vol.Optional(CONF_PROFILES, default={}): {vol.All(cv.slug, vol.NotIn([AUTO_PROFILE])): PROFILE_SCHEMA},
         vol.Optional(CONF_DIAL_TIMEOUT_SEC, default=20): cv.positive_int,
         vol.Optional(CONF_CALL_DURATION_SEC, default=30): cv.positive_int,
+        vol.Optional(CONF_SMS_MODE, default="text"): vol.In(SMS_SENDERS.keys()),
+        vol.Optional(CONF_DELIVERY_REPORTS, default=False): cv.boolean,
+        # Publish the SMS and calls the modems receive as events
+        vol.Optional(CONF_INBOUND, default=False): cv.boolean,
+        vol.Optional(CONF_CALL_STRATEGY, default=CallStrategy.ALL): vol.Coerce(CallStrategy),
+        vol.Optional(CONF_PARALLEL_CALLS, default=1): cv.positive_int,
+        vol.Optional(CONF_CALL_ROUNDS, default=1): cv.positive_int,
+        vol.Optional(CONF_MAX_ESCALATION_SEC): cv.positive_int,
+        vol.Optional(CONF_RATE_LIMIT, default={}): vol.Schema({
+            vol.Optional(CONF_PER_TARGET): vol.All(vol.Coerce(int), vol.Range(min=1)),
+            vol.Optional(CONF_PER_MODEM): vol.All(vol.Coerce(int), vol.Range(min=1)),
+            vol.Optional(CONF_PERIOD_SEC, default=60): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        }),
+        vol.Optional(CONF_DEDUP_WINDOW_SEC, default=0): cv.positive_int,
+        # Attempts per target before a failed call or SMS is dropped from the outbox
+        vol.Optional(CONF_MAX_ATTEMPTS, default=3): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        # Shared by every service of the device, the first one setting it deciding
+        vol.Optional(CONF_SERIAL): vol.Schema({
+            # "auto" tests the candidate settings once and keeps the fastest reliable one
+            vol.Optional(CONF_BAUDRATE, default=DEFAULT_BAUDRATE): vol.Any("auto", cv.positive_int),
+            vol.Optional(CONF_RTSCTS): cv.boolean,
+            vol.Optional(CONF_DSRDTR): cv.boolean,
+        }),
         # CONF_AT_COMMAND is replaced by CONF_HARDWARE
         vol.Optional(CONF_AT_COMMAND, default="ATD"): cv.matches_regex("^(ATD|ATDT)$"),
     }
-)
+), cv.has_at_least_one_key(CONF_DEVICE, CONF_DEVICES), _known_hardware)
 
 
-def get_service(
-    _hass: HomeAssistant,
+async def async_get_service(
+    hass: HomeAssistant,
     config: ConfigType,
     _discovery_info: DiscoveryInfoType | None = None,
 ) -> BaseNotificationService:
     """Get the appropriate GSM notification service."""
+    devices = config.get(CONF_DEVICES) or [config[CONF_DEVICE]]
+    dispatcher = async_get_dispatcher(hass, devices)
+    async_load_sensors(hass, devices)
+    if config[CONF_INBOUND]:
+        for session in dispatcher.sessions:
+            async_enable_inbound(hass, session)
+
+    if (serial := config.get(CONF_SERIAL)) is not None:
+        baudrate = serial[CONF_BAUDRATE]
+        settings = SerialSettings(
+            None if baudrate == "auto" else baudrate, serial.get(CONF_RTSCTS), serial.get(CONF_DSRDTR)
+        )
+        for session in dispatcher.sessions:
+            session.configure_serial(settings)
+
+    rate_limit = config[CONF_RATE_LIMIT]
+    if per_modem := rate_limit.get(CONF_PER_MODEM):
+        for session in dispatcher.sessions:
+            session.limit_rate(per_modem, rate_limit[CONF_PERIOD_SEC])
+
+    registry = async_get_profile_registry(hass).scoped(
+        ModemProfile.from_config(name, profile_config) for name, profile_config in config[CONF_PROFILES].items()
+    )
+    service = await _async_create_service(registry, dispatcher, config)
+    if rate_limit.get(CONF_PER_TARGET) or config[CONF_DEDUP_WINDOW_SEC]:
+        service.admission = AdmissionControl(
+            hass,
+            per_target=rate_limit.get(CONF_PER_TARGET),
+            period_sec=rate_limit[CONF_PERIOD_SEC],
+            dedup_window_sec=config[CONF_DEDUP_WINDOW_SEC],
+            send_summary=service.send_summary if isinstance(service, GsmSmsNotificationService) else None,
+        )
+
+    outbox = async_get_outbox(hass)
+    await outbox.async_load()
+    service.outbox = outbox
+    # The entries of a service are found again by its type and name, or devices, after a restart
+    service.outbox_key = f"{config.get(CONF_TYPE, 'call')}:{config.get(CONF_NAME) or ','.join(devices)}"
+    outbox.async_register(service.outbox_key, service.redeliver, config[CONF_MAX_ATTEMPTS])
+    _async_register_cancel(hass, service)
+    return service
+
+
+@callback
+def _async_register_cancel(hass: HomeAssistant, service: GsmBaseNotificationService) -> None:
+    """Register the gsm_call.cancel action once, aborting the calls and SMS of every service."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (services := data.get("services")) is not None:
+        services.append(service)
+        return
+    services = data["services"] = [service]
+
+    async def _cancel(call: ServiceCall) -> None:
+        targets = None
+        if ATTR_TARGET in call.data:
+            targets = {re.sub(r"\D", "", target) for target in call.data[ATTR_TARGET]}
+
+        for notify_service in services:
+            notify_service.cancel(targets)
+        cancelled = async_get_queue(hass).cancel_targets(targets)
+        _LOGGER.info(f"Cancelled {cancelled} call(s) and SMS to {', '.join(sorted(targets or ['any target']))}")
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_CANCEL, _cancel,
+        schema=vol.Schema({vol.Optional(ATTR_TARGET): vol.All(cv.ensure_list, [cv.string])}),
+    )
+
+
+async def _async_create_service(
+        registry: ProfileRegistry, dispatcher: ModemDispatcher, config: ConfigType) -> GsmBaseNotificationService:
+    # Only the sender or dialer of the service is imported
     if config.get(CONF_TYPE, "call") == "sms":
-        sender = SmsSender()
-        return GsmSmsNotificationService(config[CONF_DEVICE], sender)
+        sender = await registry.async_create_sender(
+            config[CONF_SMS_MODE], delivery_reports=config[CONF_DELIVERY_REPORTS]
+        )
+        return GsmSmsNotificationService(dispatcher, sender)
     else:  # call
         dialer_name = config[CONF_HARDWARE]
 
-        if config[CONF_HARDWARE] == "atd" and config[CONF_AT_COMMAND] == "ATDT":
+        if config[CONF_HARDWARE] in ("auto", "atd") and config[CONF_AT_COMMAND] == "ATDT":
             dialer_name = "atdt"
 
-        dialer = SUPPORTED_DIALERS[dialer_name](
+        dialer = await registry.async_create_dialer(
+            dialer_name,
             dial_timeout_sec=config[CONF_DIAL_TIMEOUT_SEC],
             call_duration_sec=config[CONF_CALL_DURATION_SEC],
         )
 
-        return GsmCallNotificationService(config[CONF_DEVICE], dialer)
+        return GsmCallNotificationService(
+            dispatcher,
+            dialer,
+            strategy=config[CONF_CALL_STRATEGY],
+            parallel_calls=config[CONF_PARALLEL_CALLS],
+            rounds=config[CONF_CALL_ROUNDS],
+            max_escalation_sec=config.get(CONF_MAX_ESCALATION_SEC),
+        )
 
 
 class GsmBaseNotificationService(BaseNotificationService):
     """Base class for GSM notification services."""
 
-    # Class-level modem instance
-    modem: Modem | None = None
+    default_priority = Priority.NORMAL
+    batchable = False
+    # Whether the jobs may run on a modem in the middle of a voice call, if the modem supports it
+    during_call = False
 
-    def __init__(self, device_path: str):
+    def __init__(self, dispatcher: ModemDispatcher):
         """Initialize the base service."""
-        self.device_path = device_path
-        self.modem: Modem | None = None
-
-    async def connect(self) -> None:
-        """Connect to the modem."""
-        _LOGGER.debug(f"Connecting to {self.device_path}...")
-        self.modem = Modem(
-            *await serial_asyncio.open_serial_connection(
-                url=self.device_path,
-                baudrate=75600,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                dsrdtr=True,
-                rtscts=True,
-                limit=READ_LIMIT,
-            )
+        self.dispatcher = dispatcher
+        # Rate limiting and deduplication, None to let every notification through
+        self.admission: AdmissionControl | None = None
+        # Journal of the jobs not delivered yet, None to neither persist nor retry them
+        self.outbox: Outbox | None = None
+        self.outbox_key = DOMAIN
+
+    @property
+    def handler(self) -> JobHandler:
+        """Handler of the jobs queued for a single target, the ones kept in the outbox."""
+        raise NotImplementedError
+
+    @callback
+    def cancel(self, targets: set[str] | None) -> None:
+        """Stop what the service has in progress for the targets, or all of them, beyond the dispatcher's jobs."""
+
+    async def redeliver(self, entry: OutboxEntry) -> aio.Future:
+        """Queue the job of an outbox entry again, after a failure or a restart."""
+        return await self.dispatcher.enqueue(
+            self.handler, entry.target, entry.message, Priority(entry.priority), self.batchable,
+            during_call=self.during_call,
         )
 
-    async def terminate(self) -> None:
-        """Terminate the modem connection."""
-        if self.modem is None:
-            return
+    async def _dispatch(self, handler: JobHandler, targets: list[str], message: str, data: dict | None) -> None:
+        """Queue one job per valid target let through by admission control and wait until all of them are done."""
+        priority = self._get_priority(data)
+        messages = self._admit(self._valid_phone_numbers(targets), message, priority)
+        await self._deliver(handler, messages, priority, (data or {}).get(ATTR_IDEMPOTENCY_KEY))
+
+    def _admit(self, phone_numbers: list[str], message: str, priority: Priority) -> list[tuple[str, str]]:
+        """Return the (phone number, message) pairs to send, summaries of suppressed alerts folded in."""
+        # Critical alerts always go through
+        if self.admission is None or priority == Priority.CRITICAL:
+            return [(phone_number, message) for phone_number in phone_numbers]
+        return [
+            (phone_number, admitted) for phone_number in phone_numbers
+            if (admitted := self.admission.admit(phone_number, message)) is not None
+        ]
+
+    async def _deliver(
+            self, handler: JobHandler, messages: list[tuple[str, str]], priority: Priority,
+            idempotency_key: str | None = None,
+    ) -> None:
+        futures = []
+        for phone_number, message in messages:
+            entry = None
+            if self.outbox is not None:
+                entry = self.outbox.async_add(self.outbox_key, phone_number, message, priority, idempotency_key)
+                if entry is None:
+                    continue
 
-        _LOGGER.debug("Closing connection to the modem...")
-        self.modem.writer.close()
-        await self.modem.writer.wait_closed()
-        self.modem = None
+            future = await self.dispatcher.enqueue(
+                handler, phone_number, message, priority, self.batchable, during_call=self.during_call
+            )
+            if entry is not None:
+                self.outbox.async_track(entry, future)
+            futures.append(future)
+
+        # Shielded, since a merged job's future is shared with other callers
+        results = await aio.gather(*(aio.shield(f) for f in futures), return_exceptions=True)
+        if errors := [r for r in results if isinstance(r, Exception)]:
+            for error in errors[1:]:
+                _LOGGER.error(f"Failed to deliver notification: {error}")
+            raise errors[0]
+
+    def _get_priority(self, data: dict | None) -> Priority:
+        try:
+            return Priority[(data or {}).get(ATTR_PRIORITY, self.default_priority.name).upper()]
+        except (KeyError, AttributeError):
+            raise HomeAssistantError(f"Unknown priority, expected one of: {', '.join(p.name.lower() for p in Priority)}")
+
+    def _valid_phone_numbers(self, targets: list[str]) -> list[str]:
+        phone_numbers = []
+        for target in targets:
+            try:
+                phone_numbers.append(self._validate_phone_number(target))
+            except ValueError as e:
+                _LOGGER.error(f"Invalid phone number {target}: {e}")
+        return phone_numbers
 
     def _validate_phone_number(self, phone_number: str) -> str:
         """Validate and normalize phone number."""
@@ -124,10 +314,30 @@ class GsmBaseNotificationService(BaseNotificationService):
 class GsmCallNotificationService(GsmBaseNotificationService):
     """Service for making GSM voice calls."""
 
-    def __init__(self, device_path: str, dialer):
+    default_priority = Priority.HIGH
+
+    def __init__(
+        self,
+        dispatcher: ModemDispatcher,
+        dialer,
+        strategy: CallStrategy = CallStrategy.ALL,
+        parallel_calls: int = 1,
+        rounds: int = 1,
+        max_escalation_sec: int | None = None,
+    ):
         """Initialize the call service."""
-        super().__init__(device_path)
+        super().__init__(dispatcher)
         self.dialer = dialer
+        self.strategy = strategy
+        self.parallel_calls = parallel_calls
+        self.rounds = rounds
+        self.max_escalation_sec = max_escalation_sec
+        # Numbers of the escalations in progress, emptied to stop one
+        self._escalations: list[set[str]] = []
+
+    @property
+    def handler(self) -> JobHandler:
+        return self._call
 
     async def async_send_message(self, _message="", **kwargs):
         """Make a voice call to the specified targets."""
@@ -135,64 +345,102 @@ class GsmCallNotificationService(GsmBaseNotificationService):
             _LOGGER.info("At least 1 target is required")
             return
 
-        # Check if already making a call
-        if GsmBaseNotificationService.modem:
-            _LOGGER.info("Already making a voice call")
+        if self.strategy == CallStrategy.ALL:
+            await self._dispatch(self._call, targets, "", kwargs.get(ATTR_DATA))
             return
 
+        priority = self._get_priority(kwargs.get(ATTR_DATA))
+        if ATTR_IDEMPOTENCY_KEY in (kwargs.get(ATTR_DATA) or {}):
+            # Escalations bypass the outbox, which keeps the keys
+            _LOGGER.warning(f"idempotency_key is ignored with the {self.strategy.value} call strategy")
+        if phone_numbers := [number for number, _ in self._admit(self._valid_phone_numbers(targets), "", priority)]:
+            await self._escalate(phone_numbers, priority)
+
+    @callback
+    def cancel(self, targets: set[str] | None) -> None:
+        for escalation in self._escalations:
+            if targets is None or not escalation.isdisjoint(targets):
+                escalation.clear()
+
+    async def _escalate(self, phone_numbers: list[str], priority: Priority) -> None:
+        """Call the targets in groups of parallel_calls, round after round, until one of them answers."""
+        escalation = set(phone_numbers)
+        self._escalations.append(escalation)
         try:
-            await self.connect()
+            async with aio.timeout(self.max_escalation_sec):
+                for round_no in range(1, self.rounds + 1):
+                    for step, start in enumerate(range(0, len(phone_numbers), self.parallel_calls), start=1):
+                        if not escalation:
+                            _LOGGER.info("Escalation cancelled")
+                            return
+                        group = phone_numbers[start:start + self.parallel_calls]
+                        attributes = {ATTR_STRATEGY: self.strategy, ATTR_ROUND: round_no, ATTR_STEP: step}
+                        if await self._ring_group(group, priority, attributes):
+                            return
+        except TimeoutError:
+            _LOGGER.warning(f"Escalation stopped after {self.max_escalation_sec}s without an answer")
+            return
+        finally:
+            self._escalations.remove(escalation)
 
-            for target in targets:
-                try:
-                    phone_number = self._validate_phone_number(target)
-                except ValueError as e:
-                    _LOGGER.error(f"Invalid phone number {target}: {e}")
-                    continue
+        _LOGGER.info(f"Nobody answered after {self.rounds} round(s)")
 
-                call_state = await self.dialer.dial(GsmBaseNotificationService.modem, phone_number)
-                self.hass.bus.async_fire(
-                    EVENT_GSM_CALL_ENDED,
-                    {ATTR_PHONE_NUMBER: phone_number, ATTR_REASON: call_state},
-                )
+    async def _ring_group(self, phone_numbers: list[str], priority: Priority, attributes: dict) -> bool:
+        """Ring the numbers at once, returns True as soon as one answers and hangs up on the others."""
+        # Not through the outbox: retried or replayed after a restart, a call would ring outside its escalation
+        pending = {
+            await self.dispatcher.enqueue(self._call, phone_number, "", priority, attributes=attributes)
+            for phone_number in phone_numbers
+        }
+        try:
+            while pending:
+                done, pending = await aio.wait(pending, return_when=aio.FIRST_COMPLETED)
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    if (error := future.exception()) is not None:
+                        _LOGGER.error(f"Call failed during escalation: {error}")
+                    elif future.result() == EndedReason.ANSWERED:
+                        return True
+            return False
         finally:
-            await self.terminate()
-
-    async def connect(self):
-        """Connect to the modem for calls."""
-        _LOGGER.debug(f"Connecting to {self.device_path} for voice call...")
-        GsmBaseNotificationService.modem = Modem(
-            *await serial_asyncio.open_serial_connection(
-                url=self.device_path,
-                baudrate=75600,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                dsrdtr=True,
-                rtscts=True,
-                limit=READ_LIMIT,
-            )
+            for future in pending:
+                self.dispatcher.cancel(future)
+
+    async def _call(self, modem: Modem, jobs: list[Job]) -> list[EndedReason]:
+        results = []
+        for job in jobs:
+            try:
+                call_state = await self.dialer.dial(modem, job.target)
+            except aio.CancelledError:
+                self._fire_call_ended(job, EndedReason.CANCELLED)
+                raise
+            self._fire_call_ended(job, call_state)
+            results.append(call_state)
+        return results
+
+    def _fire_call_ended(self, job: Job, reason: EndedReason) -> None:
+        self.hass.bus.async_fire(
+            EVENT_GSM_CALL_ENDED,
+            {ATTR_PHONE_NUMBER: job.target, ATTR_REASON: reason, **job.attributes},
         )
 
-    async def terminate(self):
-        """Terminate the modem connection for calls."""
-        if GsmBaseNotificationService.modem is None:
-            return
-
-        _LOGGER.debug("Closing connection to the modem after voice call...")
-        GsmBaseNotificationService.modem.writer.close()
-        await GsmBaseNotificationService.modem.writer.wait_closed()
-        GsmBaseNotificationService.modem = None
-
 
 class GsmSmsNotificationService(GsmBaseNotificationService):
     """Service for sending GSM SMS messages."""
 
-    def __init__(self, device_path: str, sender):
+    batchable = True
+    during_call = True
+
+    def __init__(self, dispatcher: ModemDispatcher, sender):
         """Initialize the SMS service."""
-        super().__init__(device_path)
+        super().__init__(dispatcher)
         self.sender = sender
 
+    @property
+    def handler(self) -> JobHandler:
+        return self._send_sms
+
     async def async_send_message(self, message="", **kwargs):
         """Send an SMS message to the specified targets."""
         if not (targets := kwargs.get(ATTR_TARGET)):
@@ -203,52 +451,36 @@ class GsmSmsNotificationService(GsmBaseNotificationService):
             _LOGGER.error("SMS requires a non-empty message")
             return
 
-        # Validate message for GSM 7-bit alphabet
-        if not re.match(GSM_7BIT_ALPHABET, message):
+        # Validate message for GSM 7-bit alphabet, PDU mode falls back to UCS-2 by itself
+        if not self.sender.supports_unicode and not re.match(GSM_7BIT_ALPHABET, message):
             _LOGGER.error("SMS message contains invalid characters")
             raise HomeAssistantError("Only basic Latin letters, digits, and common symbols are supported")
 
-        # Check if already connected for SMS
-        if GsmSmsNotificationService.modem:
-            _LOGGER.info("Already connected to the modem for SMS")
-            return
+        await self._dispatch(self._send_sms, targets, message, kwargs.get(ATTR_DATA))
 
-        try:
-            await self.connect()
+    @callback
+    def send_summary(self, phone_number: str, summary: str) -> None:
+        """Send the summary of the alerts admission control suppressed for the number."""
 
-            for target in targets:
-                try:
-                    phone_number = self._validate_phone_number(target)
-                except ValueError as e:
-                    _LOGGER.error(f"Invalid phone number {target}: {e}")
-                    continue
+        async def _send() -> None:
+            try:
+                await self._deliver(self._send_sms, [(phone_number, summary)], self.default_priority)
+            except HomeAssistantError as e:
+                _LOGGER.error(f"Failed to send the alert summary to +{phone_number}: {e}")
 
-                await self.sender.send(GsmSmsNotificationService.modem, phone_number, message)
-        finally:
-            await self.terminate()
-
-    async def connect(self):
-        """Connect to the modem for SMS."""
-        _LOGGER.debug(f"Connecting to {self.device_path} for SMS...")
-        GsmSmsNotificationService.modem = Modem(
-            *await serial_asyncio.open_serial_connection(
-                url=self.device_path,
-                baudrate=75600,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                dsrdtr=True,
-                rtscts=True,
-                limit=READ_LIMIT,
-            )
-        )
+        self.hass.async_create_background_task(_send(), name=f"{DOMAIN} alert summary")
 
-    async def terminate(self):
-        """Terminate the modem connection for SMS."""
-        if GsmSmsNotificationService.modem is None:
-            return
-
-        _LOGGER.debug("Closing connection to the modem after SMS...")
-        GsmSmsNotificationService.modem.writer.close()
-        await GsmSmsNotificationService.modem.writer.wait_closed()
-        GsmSmsNotificationService.modem = None
+    async def _send_sms(self, modem: Modem, jobs: list[Job]) -> list[BaseException | None]:
+        # The numbers of a running batch cancelled by gsm_call.cancel are skipped, the others still get the SMS
+        futures = {job.target: job.future for job in jobs}
+        errors = await self.sender.send_batch(
+            modem, list(futures), jobs[0].message, skip=lambda number: futures[number].cancelled()
+        )
+        for job, error in zip(jobs, errors):
+            if isinstance(error, aio.CancelledError):
+                continue
+            event_data = {ATTR_PHONE_NUMBER: job.target, ATTR_REASON: SmsResult.FAILED if error else SmsResult.SENT}
+            if error:
+                event_data[ATTR_ERROR] = str(error)
+            self.hass.bus.async_fire(EVENT_GSM_SMS_SENT, event_data)
+        return errors
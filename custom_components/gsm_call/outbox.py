@@ -0,0 +1,196 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+import random
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from functools import partial
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.storage import Store
+
+from .const import _LOGGER, DOMAIN
+
+STORAGE_KEY = f"{DOMAIN}.outbox"
+STORAGE_VERSION = 1
+# Changes within this delay are written together, so a burst of alerts costs a single write
+STORAGE_SAVE_DELAY_SEC = 1
+
+RETRY_BASE_SEC = 30
+RETRY_MAX_SEC = 30 * 60
+# Delivered entries are kept this long, to recognize a request sent again with the same idempotency key
+DELIVERED_TTL_SEC = 24 * 60 * 60
+
+# Queues the entry's job again, returning the dispatcher's future for it
+Redeliver = Callable[["OutboxEntry"], Awaitable[aio.Future]]
+
+
+@dataclass
+class OutboxEntry:
+    # Idempotency key, a random one unless the caller gave one
+    key: str
+    service: str
+    target: str
+    message: str
+    priority: int
+    created_at: float
+    # {"at": <timestamp>, "error": <message>} per failed attempt
+    attempts: list[dict] = field(default_factory=list)
+    next_attempt_at: float = 0.0
+    delivered_at: float | None = None
+
+
+class Outbox:
+    """Journal of the calls and SMS not delivered yet, stored so they survive a restart and can be retried."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._store: Store[dict[str, dict]] = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._entries: dict[str, OutboxEntry] = {}
+        self._services: dict[str, tuple[Redeliver, int]] = {}
+        self._timers: dict[str, CALLBACK_TYPE] = {}
+        self._loaded = False
+        self._lock = aio.Lock()
+
+    async def async_load(self) -> None:
+        async with self._lock:
+            if self._loaded:
+                return
+            data = await self._store.async_load() or {}
+            self._loaded = True
+
+            expired_before = time.time() - DELIVERED_TTL_SEC
+            for key, entry in data.items():
+                try:
+                    entry = OutboxEntry(**entry)
+                except TypeError:
+                    _LOGGER.warning(f"Dropping unreadable outbox entry {key}")
+                    continue
+                if entry.delivered_at is None or entry.delivered_at > expired_before:
+                    self._entries[key] = entry
+
+    @callback
+    def async_register(self, service: str, redeliver: Redeliver, max_attempts: int) -> None:
+        """Take over the service's pending entries, retrying them once Home Assistant has started."""
+        if service in self._services:
+            # Both would replay the same entries after a restart
+            raise HomeAssistantError(f"Another notify service already uses {service}, give each service a name")
+        self._services[service] = (redeliver, max_attempts)
+
+        @callback
+        def _replay(_hass: HomeAssistant) -> None:
+            pending = [e for e in self._entries.values() if e.service == service and e.delivered_at is None]
+            if pending:
+                _LOGGER.info(f"Replaying {len(pending)} undelivered notification(s) of {service}")
+            for entry in pending:
+                self._schedule(entry, max(0.0, entry.next_attempt_at - time.time()))
+
+        async_at_started(self.hass, _replay)
+
+    @callback
+    def async_add(
+            self, service: str, target: str, message: str, priority: int, key: str | None = None,
+    ) -> OutboxEntry | None:
+        """Record a notification about to be queued, None if one with the same key is pending or delivered."""
+        key = f"{key}:{target}" if key else uuid.uuid4().hex
+        if key in self._entries:
+            _LOGGER.info(f"Skipping notification for {target}: idempotency key {key} already seen")
+            return None
+
+        entry = self._entries[key] = OutboxEntry(key, service, target, message, priority, time.time())
+        self._save()
+        return entry
+
+    @callback
+    def async_track(self, entry: OutboxEntry, future: aio.Future) -> None:
+        """Settle the entry with the result of the job queued for it."""
+        future.add_done_callback(partial(self._settle, entry))
+
+    @callback
+    def async_delivered(self, entry: OutboxEntry) -> None:
+        entry.delivered_at = time.time()
+        self._save()
+
+    @callback
+    def async_discard(self, entry: OutboxEntry) -> None:
+        self._entries.pop(entry.key, None)
+        if (cancel := self._timers.pop(entry.key, None)) is not None:
+            cancel()
+        self._save()
+
+    @callback
+    def async_failed(self, entry: OutboxEntry, error: Exception) -> None:
+        """Record the failed attempt and schedule the next one, unless the service's attempts are used up."""
+        entry.attempts.append({"at": time.time(), "error": str(error)})
+        _, max_attempts = self._services.get(entry.service, (None, 1))
+        if len(entry.attempts) >= max_attempts:
+            _LOGGER.error(f"Giving up on {entry.target} after {len(entry.attempts)} attempt(s): {error}")
+            self.async_discard(entry)
+            return
+
+        # Exponential backoff with jitter, so modems recovering together don't get all retries at once
+        delay = min(RETRY_BASE_SEC * 2 ** (len(entry.attempts) - 1), RETRY_MAX_SEC) * random.uniform(0.5, 1.5)
+        entry.next_attempt_at = time.time() + delay
+        _LOGGER.warning(f"Attempt {len(entry.attempts)} for {entry.target} failed, retrying in {delay:.0f}s: {error}")
+        self._save()
+        self._schedule(entry, delay)
+
+    def _schedule(self, entry: OutboxEntry, delay: float) -> None:
+        self._timers[entry.key] = async_call_later(self.hass, delay, partial(self._retry, entry.key))
+
+    @callback
+    def _retry(self, key: str, _now: datetime) -> None:
+        self._timers.pop(key, None)
+        if (entry := self._entries.get(key)) is None or entry.delivered_at is not None:
+            return
+        if (service := self._services.get(entry.service)) is None:
+            return
+
+        redeliver, _ = service
+
+        async def _attempt() -> None:
+            try:
+                self.async_track(entry, await redeliver(entry))
+            except Exception as e:  # noqa: BLE001 - any failure is one more attempt
+                self.async_failed(entry, e)
+
+        self.hass.async_create_background_task(_attempt(), name=f"{DOMAIN} outbox retry for {entry.target}")
+
+    @callback
+    def _settle(self, entry: OutboxEntry, future: aio.Future) -> None:
+        if future.cancelled():
+            # Jobs still queued are cancelled on shutdown, those are replayed on the next start
+            if not self.hass.is_stopping:
+                self.async_discard(entry)
+        elif (error := future.exception()) is not None:
+            self.async_failed(entry, error)
+        else:
+            self.async_delivered(entry)
+
+    def _save(self) -> None:
+        self._store.async_delay_save(self._data_to_save, STORAGE_SAVE_DELAY_SEC)
+
+    @callback
+    def _data_to_save(self) -> dict[str, dict]:
+        expired_before = time.time() - DELIVERED_TTL_SEC
+        for key in [k for k, e in self._entries.items() if e.delivered_at is not None and e.delivered_at < expired_before]:
+            del self._entries[key]
+        return {key: asdict(entry) for key, entry in self._entries.items()}
+
+
+@callback
+def async_get_outbox(hass: HomeAssistant) -> Outbox:
+    data = hass.data.setdefault(DOMAIN, {})
+    if (outbox := data.get("outbox")) is None:
+        outbox = data["outbox"] = Outbox(hass)
+    return outbox
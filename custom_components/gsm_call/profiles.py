@@ -0,0 +1,148 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import importlib
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.typing import ConfigType
+
+from .calls.call_state import CallState
+from .const import (_LOGGER, CONF_CALL_STATE_URCS, CONF_DIAL_COMMAND,
+                    CONF_HANGUP_COMMANDS, CONF_HANGUP_DELAY_SEC,
+                    CONF_INIT_COMMANDS, CONF_MANUFACTURERS, DOMAIN)
+
+DEFAULT_HANGUP_COMMANDS = ("AT+CHUP", "ATH")
+
+
+@dataclass(frozen=True)
+class ModemProfile:
+    """How to place and end voice calls on one kind of modem, as data rather than a dialer subclass."""
+
+    name: str
+    # module:class of the dialer under the integration, imported only once a modem needs the profile
+    dialer: str = "calls.at_dialer:ATDialer"
+    dial_command: str = "ATD"
+    # Vendor settings the hardware needs before its first call, applied once per connection
+    init_commands: tuple[str, ...] = ()
+    hangup_commands: tuple[str, ...] = DEFAULT_HANGUP_COMMANDS
+    # Pause before hanging up, for hardware which needs time to settle the final call state
+    hangup_delay_sec: float = 0
+    # Prefixes of vendor URCs and the call state they report, on top of the standard ones
+    call_state_urcs: tuple[tuple[str, CallState], ...] = ()
+    # Substrings of the manufacturer or model the profile is picked for with hardware: auto
+    manufacturers: tuple[str, ...] = ()
+
+    @classmethod
+    def from_config(cls, name: str, config: ConfigType) -> ModemProfile:
+        return cls(
+            name,
+            dial_command=config[CONF_DIAL_COMMAND],
+            init_commands=tuple(config[CONF_INIT_COMMANDS]),
+            hangup_commands=tuple(config[CONF_HANGUP_COMMANDS]),
+            hangup_delay_sec=config[CONF_HANGUP_DELAY_SEC],
+            call_state_urcs=tuple(config[CONF_CALL_STATE_URCS].items()),
+            manufacturers=tuple(m.upper() for m in config[CONF_MANUFACTURERS]),
+        )
+
+
+BUILTIN_PROFILES = (
+    ModemProfile("atd"),
+    ModemProfile("atdt", dial_command="ATDT"),
+    # ZTE's magic command, needed before the modem places voice calls
+    ModemProfile("zte", init_commands=("AT%icscall=1,0",), manufacturers=("ZTE",)),
+    # Enable circuit-switched data transfer, then digital voice
+    ModemProfile(
+        "gtm382", init_commands=("AT_ODO=0", "AT_OPCMENABLE=1"), manufacturers=("OPTION", "GLOBETROTTER")
+    ),
+)
+DEFAULT_PROFILE = "atd"
+
+# The profile picking one of the others for each modem from the manufacturer it reports
+AUTO_PROFILE = "auto"
+AUTO_DIALER = "calls.auto_dialer:AutoDialer"
+
+# sms_mode option mapped to the module:class of its sender
+SMS_SENDERS = {
+    "text": "sms.sms_sender:SmsSender",
+    "pdu": "sms.pdu_sender:PduSmsSender",
+}
+
+
+class ProfileRegistry:
+    """The modem profiles a service may use, the built-in ones and those added in its configuration.
+
+    Dialer and sender modules are imported on first use, in the executor, so setting up a service
+    only loads the implementation it needs.
+    """
+
+    def __init__(
+            self, hass: HomeAssistant, profiles: Iterable[ModemProfile] = BUILTIN_PROFILES,
+            classes: dict[str, Any] | None = None,
+    ):
+        self.hass = hass
+        self._profiles: dict[str, ModemProfile] = {profile.name: profile for profile in profiles}
+        self._classes: dict[str, Any] = {} if classes is None else classes
+
+    @property
+    def names(self) -> list[str]:
+        return [AUTO_PROFILE, *self._profiles]
+
+    def get(self, name: str) -> ModemProfile | None:
+        return self._profiles.get(name)
+
+    def scoped(self, profiles: Iterable[ModemProfile]) -> ProfileRegistry:
+        """Return the registry of one service, its own profiles added to these and winning over them.
+
+        Profiles stay with the service defining them, so they can't change the hardware of the others.
+        """
+        profiles = list(profiles)
+        for profile in profiles:
+            if profile.name in self._profiles:
+                _LOGGER.info(f"Modem profile {profile.name} replaced by the service's own definition")
+        # The imported classes are shared, modules only load once
+        return ProfileRegistry(self.hass, [*self._profiles.values(), *profiles], self._classes)
+
+    def match(self, identity: str) -> ModemProfile:
+        """Return the profile for a modem's manufacturer and model, the ones added last winning."""
+        identity = identity.upper()
+        for profile in reversed(self._profiles.values()):
+            if any(name in identity for name in profile.manufacturers):
+                return profile
+        return self._profiles[DEFAULT_PROFILE]
+
+    async def async_load(self, path: str) -> Any:
+        """Import the module:class under the integration and return the class."""
+        if (cls := self._classes.get(path)) is None:
+            module_name, _, class_name = path.partition(":")
+            module = await self.hass.async_add_executor_job(
+                importlib.import_module, f".{module_name}", __package__
+            )
+            cls = self._classes[path] = getattr(module, class_name)
+        return cls
+
+    async def async_create_dialer(self, name: str, dial_timeout_sec: int, call_duration_sec: int) -> Any:
+        if name == AUTO_PROFILE:
+            dialer_class = await self.async_load(AUTO_DIALER)
+            return dialer_class(dial_timeout_sec, call_duration_sec, self)
+
+        profile = self._profiles[name]
+        dialer_class = await self.async_load(profile.dialer)
+        return dialer_class(dial_timeout_sec, call_duration_sec, profile)
+
+    async def async_create_sender(self, sms_mode: str, **kwargs: Any) -> Any:
+        sender_class = await self.async_load(SMS_SENDERS[sms_mode])
+        return sender_class(**kwargs)
+
+
+@callback
+def async_get_profile_registry(hass: HomeAssistant) -> ProfileRegistry:
+    data = hass.data.setdefault(DOMAIN, {})
+    if (registry := data.get("profiles")) is None:
+        registry = data["profiles"] = ProfileRegistry(hass)
+    return registry
@@ -0,0 +1,67 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+from dataclasses import asdict
+from typing import Any, Generic, TypeVar
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY_SEC = 10
+
+RecordT = TypeVar("RecordT")
+
+
+class RecordStore(Generic[RecordT]):
+    """Dataclass records by key in Home Assistant's storage, loaded on first use and saved shortly after a change."""
+
+    def __init__(self, hass: HomeAssistant, storage_key: str, record_type: type[RecordT]):
+        self._store: Store[dict[str, dict]] = Store(hass, STORAGE_VERSION, storage_key)
+        self._record_type = record_type
+        self._records: dict[str, dict] | None = None
+        self._lock = aio.Lock()
+
+    async def async_get(self, key: str) -> RecordT | None:
+        async with self._lock:
+            if self._records is None:
+                self._records = await self._store.async_load() or {}
+
+        if (data := self._records.get(key)) is None:
+            return None
+        try:
+            return self._record_type(**data)
+        except TypeError:
+            # Saved by a version with other fields, found again the hard way
+            return None
+
+    @callback
+    def async_set(self, key: str, record: RecordT) -> None:
+        # Nothing loaded yet, the record would overwrite the others on save
+        if self._records is None:
+            return
+        self._records[key] = asdict(record)
+        self._save()
+
+    @callback
+    def async_forget(self, key: str) -> None:
+        if self._records is not None and self._records.pop(key, None) is not None:
+            self._save()
+
+    def _save(self) -> None:
+        self._store.async_delay_save(lambda: self._records, STORAGE_SAVE_DELAY_SEC)
+
+
+@callback
+def async_get_record_store(hass: HomeAssistant, name: str, record_type: type[Any]) -> RecordStore:
+    """Return the record store shared under the name, stored as gsm_call.<name>, creating it on first use."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (store := data.get(name)) is None:
+        store = data[name] = RecordStore(hass, f"{DOMAIN}.{name}", record_type)
+    return store
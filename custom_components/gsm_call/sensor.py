@@ -0,0 +1,214 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.components.sensor import (SensorDeviceClass, SensorEntity,
+                                             SensorEntityDescription,
+                                             SensorStateClass)
+from homeassistant.const import (SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
+                                 EntityCategory, Platform, UnitOfInformation,
+                                 UnitOfTime)
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import discovery
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
+
+from .const import CONF_DEVICES, DOMAIN
+from .dispatcher import DispatchQueue, async_get_queue
+from .health import REGISTRATION_STATES
+from .metrics import ModemMetrics
+from .session import ModemSession, async_get_session
+
+# The metrics and health snapshot are in memory, polling them is cheaper than writing a state on every AT command
+SCAN_INTERVAL = timedelta(seconds=30)
+
+NO_REPLY = "no_reply"
+
+
+@dataclass(frozen=True, kw_only=True)
+class GsmModemSensorDescription(SensorEntityDescription):
+    value_fn: Callable[[ModemSession], Any]
+    attributes_fn: Callable[[ModemSession], dict] | None = None
+
+
+def _mean_command_ms(metrics: ModemMetrics) -> int | None:
+    count = sum(h.count for h in metrics.commands.values())
+    if not count:
+        return None
+    return round(sum(h.total_sec for h in metrics.commands.values()) / count * 1000)
+
+
+def _last_notification_sec(metrics: ModemMetrics) -> float | None:
+    if (histogram := metrics.phases.get("notification")) is None:
+        return None
+    return round(histogram.last_sec, 2)
+
+
+def _network_state(session: ModemSession) -> str | None:
+    if session.health.alive is False:
+        return NO_REPLY
+    return REGISTRATION_STATES.get(session.health.registration)
+
+
+def _health_attributes(session: ModemSession) -> dict:
+    return {
+        "reachable": session.health.reachable,
+        "problem": session.health.problem,
+    }
+
+
+SENSORS = (
+    GsmModemSensorDescription(
+        key="network",
+        name="Network",
+        device_class=SensorDeviceClass.ENUM,
+        options=[*REGISTRATION_STATES.values(), NO_REPLY],
+        value_fn=_network_state,
+        attributes_fn=_health_attributes,
+    ),
+    GsmModemSensorDescription(
+        key="signal_strength",
+        name="Signal strength",
+        device_class=SensorDeviceClass.SIGNAL_STRENGTH,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=SIGNAL_STRENGTH_DECIBELS_MILLIWATT,
+        value_fn=lambda s: s.health.signal_dbm,
+    ),
+    GsmModemSensorDescription(
+        key="command_latency",
+        name="AT command latency",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        value_fn=lambda s: _mean_command_ms(s.metrics),
+        attributes_fn=lambda s: {name: h.as_dict() for name, h in s.metrics.commands.items()},
+    ),
+    GsmModemSensorDescription(
+        key="command_timeouts",
+        name="AT command timeouts",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda s: s.metrics.timeouts,
+    ),
+    GsmModemSensorDescription(
+        key="notification_duration",
+        name="Notification duration",
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        value_fn=lambda s: _last_notification_sec(s.metrics),
+        attributes_fn=lambda s: {name: h.as_dict() for name, h in s.metrics.phases.items()},
+    ),
+    GsmModemSensorDescription(
+        key="bytes_read",
+        name="Bytes read",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        value_fn=lambda s: s.metrics.bytes_read,
+    ),
+    GsmModemSensorDescription(
+        key="bytes_written",
+        name="Bytes written",
+        device_class=SensorDeviceClass.DATA_SIZE,
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        value_fn=lambda s: s.metrics.bytes_written,
+    ),
+)
+
+
+@callback
+def async_load_sensors(hass: HomeAssistant, device_paths: list[str]) -> None:
+    """Add the sensors of the devices which don't have them yet."""
+    loaded: set[str] = hass.data.setdefault(DOMAIN, {}).setdefault("sensors", set())
+    if not (new_paths := [path for path in device_paths if path not in loaded]):
+        return
+    # The queue is shared by every modem, its sensor comes with the first ones
+    with_queue = not loaded
+    loaded.update(new_paths)
+
+    # Once started, so the sensor integration is already set up with the user's own configuration
+    @callback
+    def _load(hass: HomeAssistant) -> None:
+        hass.async_create_task(
+            discovery.async_load_platform(
+                hass, Platform.SENSOR, DOMAIN, {CONF_DEVICES: new_paths, "queue": with_queue}, {}
+            )
+        )
+
+    async_at_started(hass, _load)
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    _config: ConfigType,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Set up the modem sensors, only through discovery by the notify platform."""
+    if discovery_info is None:
+        return
+
+    entities: list[SensorEntity] = [
+        GsmModemSensor(async_get_session(hass, device_path), description)
+        for device_path in discovery_info[CONF_DEVICES]
+        for description in SENSORS
+    ]
+    if discovery_info.get("queue"):
+        entities.append(GsmQueueSensor(async_get_queue(hass)))
+    async_add_entities(entities)
+
+
+class GsmModemSensor(SensorEntity):
+    """One health, timing or traffic figure of a modem."""
+
+    entity_description: GsmModemSensorDescription
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, session: ModemSession, description: GsmModemSensorDescription):
+        self.entity_description = description
+        self._session = session
+        self._attr_unique_id = f"{session.device_path}_{description.key}"
+        self._attr_name = f"GSM {os.path.basename(session.device_path)} {description.name}"
+
+    @property
+    def native_value(self) -> Any:
+        return self.entity_description.value_fn(self._session)
+
+    @property
+    def extra_state_attributes(self) -> dict | None:
+        if self.entity_description.attributes_fn is None:
+            return None
+        return self.entity_description.attributes_fn(self._session)
+
+
+class GsmQueueSensor(SensorEntity):
+    """Calls and SMS waiting for a modem, with how long the last and the longest waited."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_name = "GSM queue depth"
+    _attr_unique_id = f"{DOMAIN}_queue_depth"
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, queue: DispatchQueue):
+        self._queue = queue
+
+    @property
+    def native_value(self) -> int:
+        return self._queue.depth
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        return {
+            "last_wait_sec": round(self._queue.last_wait_sec, 2),
+            "max_wait_sec": round(self._queue.max_wait_sec, 2),
+        }
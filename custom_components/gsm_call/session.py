@@ -0,0 +1,309 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import asyncio as aio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from functools import partial
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.start import async_at_started
+
+from .admission import TokenBucket
+from .capabilities import (CapabilityCache, ModemCapabilities,
+                           async_get_capability_cache, async_probe,
+                           async_read_imei)
+from .const import _LOGGER, DOMAIN
+from .delivery import DeliveryTracker, async_fire_delivery_event
+from .health import HEALTH_CHECK_INTERVAL_SEC, HealthSnapshot, async_read_health
+from .link import (LinkCache, SerialSettings, async_get_link_cache,
+                   async_open_modem, async_tune)
+from .metrics import ModemMetrics
+from .modem import Modem, UrcListener
+
+RECONNECT_BACKOFF_MIN_SEC = 1
+RECONNECT_BACKOFF_MAX_SEC = 60
+
+# A modem failing this many jobs in a row is skipped by the dispatcher for the cooldown
+UNHEALTHY_AFTER_FAILURES = 3
+UNHEALTHY_COOLDOWN_SEC = 60
+
+# Run on every new connection, once the modem has been identified
+ConnectHook = Callable[[Modem], Awaitable[None]]
+
+
+class ModemSession:
+    """Long-lived connection to a single modem, shared by every service using the same device."""
+
+    def __init__(
+            self, device_path: str, capability_cache: CapabilityCache | None = None,
+            link_cache: LinkCache | None = None,
+    ):
+        self.device_path = device_path
+        self.modem: Modem | None = None
+        self.capabilities: ModemCapabilities | None = None
+        self._capability_cache = capability_cache
+        self._link_cache = link_cache
+        # As configured, and the settings the port is actually opened with once resolved
+        self.serial = SerialSettings()
+        self._serial_configured = False
+        self._link: SerialSettings | None = None
+        # Kept across reconnects, so sensors follow the device rather than a connection
+        self.metrics = ModemMetrics()
+        self.health = HealthSnapshot()
+        self.delivery = DeliveryTracker(self.metrics)
+        # Attached to every connection, so they survive reconnects
+        self._urc_listeners: list[UrcListener] = [self.delivery.handle_urc]
+        self._connect_hooks: list[ConnectHook] = []
+        # Caps the jobs the dispatcher starts on this modem, None for no limit
+        self.rate_limit: TokenBucket | None = None
+        self._lock = aio.Lock()
+        self._stop_monitor: Callable[[], None] | None = None
+        self._connect_failures = 0
+        self._retry_at = 0.0
+        self._job_failures = 0
+        self._unhealthy_until = 0.0
+
+    @property
+    def connected(self) -> bool:
+        """Return True if the serial port is open and hasn't been dropped."""
+        return self.modem is not None and self.modem.alive
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    @property
+    def healthy(self) -> bool:
+        """Return False while the modem is cooling down after repeated failures or can't reach the network."""
+        return aio.get_running_loop().time() >= self._unhealthy_until and self.health.reachable
+
+    def record_success(self) -> None:
+        self._job_failures = 0
+        self._unhealthy_until = 0.0
+
+    def record_failure(self) -> None:
+        self._job_failures += 1
+        if self._job_failures >= UNHEALTHY_AFTER_FAILURES:
+            self.mark_unhealthy(f"{self._job_failures} failures in a row")
+
+    def mark_unhealthy(self, reason: str) -> None:
+        _LOGGER.warning(f"Skipping {self.device_path} for {UNHEALTHY_COOLDOWN_SEC}s: {reason}")
+        self._unhealthy_until = aio.get_running_loop().time() + UNHEALTHY_COOLDOWN_SEC
+
+    def add_urc_listener(self, listener: UrcListener) -> None:
+        """Call the listener with the unsolicited lines of the current connection and all later ones."""
+        self._urc_listeners.append(listener)
+        if self.modem is not None:
+            self.modem.add_urc_listener(listener)
+
+    def add_connect_hook(self, hook: ConnectHook) -> None:
+        """Run the hook on every new connection, like to apply settings a modem forgets when it restarts."""
+        self._connect_hooks.append(hook)
+
+    def configure_serial(self, settings: SerialSettings) -> None:
+        """Set how to open the port, the first service configuring a device deciding for all of them."""
+        if self._serial_configured:
+            if settings != self.serial:
+                _LOGGER.warning(
+                    f"Ignoring the serial settings {settings} for {self.device_path}, "
+                    f"already configured with {self.serial}"
+                )
+            return
+        self._serial_configured = True
+        self.serial = settings
+        self._link = None
+
+    def limit_rate(self, count: int, period_sec: float) -> None:
+        """Allow at most count jobs per period on this modem, the strictest limit of all services winning."""
+        bucket = TokenBucket(count, period_sec)
+        if self.rate_limit is None or bucket.rate < self.rate_limit.rate:
+            self.rate_limit = bucket
+
+    async def refresh_health(self) -> bool:
+        """Ping the modem and read its registration and signal into the health snapshot.
+
+        Returns whether the modem can reach the network. A modem not answering AT is reopened on next use.
+        """
+        try:
+            async with self.acquire() as modem:
+                health = await async_read_health(modem)
+                if health.alive is False:
+                    # The port is wedged: drop the connection
+                    raise ConnectionError(health.error)
+        except (OSError, HomeAssistantError) as e:
+            health = HealthSnapshot(checked_at=aio.get_running_loop().time(), alive=False, error=str(e))
+
+        if health.reachable != self.health.reachable:
+            if health.reachable:
+                _LOGGER.info(f"{self.device_path} is reachable again")
+            else:
+                _LOGGER.warning(f"{self.device_path} can't be used: {health.problem}")
+        self.health = health
+        return health.reachable
+
+    @callback
+    def async_start_monitor(self, hass: HomeAssistant) -> None:
+        """Refresh the health snapshot in the background, skipping the rounds where the modem is busy."""
+
+        @callback
+        def _check(*_args) -> None:
+            if not self.busy:
+                hass.async_create_background_task(
+                    self.refresh_health(), name=f"{DOMAIN} health check of {self.device_path}"
+                )
+
+        @callback
+        def _start(_hass: HomeAssistant) -> None:
+            self._stop_monitor = async_track_time_interval(
+                hass, _check, timedelta(seconds=HEALTH_CHECK_INTERVAL_SEC), cancel_on_shutdown=True
+            )
+            _check()
+
+        # Not during startup, where the first job connects the modem anyway
+        async_at_started(hass, _start)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Modem]:
+        """Get exclusive access to the modem, (re)connecting if needed."""
+        async with self._lock:
+            modem = await self._ensure_connected()
+            try:
+                yield modem
+            except OSError:
+                # Covers serial.SerialException too: the port is gone, reopen it on next use
+                _LOGGER.warning(f"Lost connection to {self.device_path}, will reconnect on next use")
+                await self._disconnect()
+                raise
+
+    async def close(self) -> None:
+        """Close the connection, waiting for the current user to finish."""
+        if self._stop_monitor is not None:
+            self._stop_monitor()
+            self._stop_monitor = None
+        async with self._lock:
+            await self._disconnect()
+
+    async def _ensure_connected(self) -> Modem:
+        if self.connected:
+            return self.modem
+
+        await self._disconnect()
+
+        loop = aio.get_running_loop()
+        if (delay := self._retry_at - loop.time()) > 0:
+            _LOGGER.debug(f"Waiting {delay:.1f}s before reconnecting to {self.device_path}...")
+            await aio.sleep(delay)
+
+        try:
+            with self.metrics.phase("connect"):
+                self.modem = await self._open()
+            with self.metrics.phase("identify"):
+                await self._identify(self.modem)
+            for hook in self._connect_hooks:
+                await hook(self.modem)
+        except OSError as e:
+            await self._disconnect()
+            self._connect_failures += 1
+            backoff = min(RECONNECT_BACKOFF_MIN_SEC * 2 ** (self._connect_failures - 1), RECONNECT_BACKOFF_MAX_SEC)
+            self._retry_at = loop.time() + backoff
+            raise HomeAssistantError(f"Unable to open {self.device_path}: {e}") from e
+
+        self._connect_failures = 0
+        self._retry_at = 0.0
+        self._job_failures = 0
+        self._unhealthy_until = 0.0
+        return self.modem
+
+    async def _open(self) -> Modem:
+        link = await self._resolve_link()
+        _LOGGER.debug(f"Connecting to {self.device_path} at {link}...")
+        modem = await async_open_modem(self.device_path, link, self.metrics)
+        modem.delivery = self.delivery
+        for listener in self._urc_listeners:
+            modem.add_urc_listener(listener)
+        modem.start()
+        return modem
+
+    async def _resolve_link(self) -> SerialSettings:
+        """Return the settings to open the port with, self-testing the candidates if the baud rate is auto."""
+        if self._link is not None:
+            return self._link
+        if not self.serial.auto:
+            self._link = self.serial.resolved()
+            return self._link
+
+        saved = await self._link_cache.async_get(self.device_path) if self._link_cache is not None else None
+        # Tested again when the flow control configured has changed since
+        if saved is not None and saved in self.serial.candidates(saved.baudrate):
+            self._link = saved
+            return saved
+
+        if (best := await async_tune(self.device_path, self.serial)) is None:
+            raise ConnectionError("no serial setting tried got a reliable answer")
+        self._link = best.settings
+        if self._link_cache is not None:
+            self._link_cache.async_set(self.device_path, best.settings)
+        return self._link
+
+    async def _identify(self, modem: Modem) -> None:
+        """Attach the modem's capabilities, probing it only the first time its IMEI is seen."""
+        if not await modem.reset() and self.serial.auto:
+            # The modem may have been replaced or reconfigured since the settings were tested
+            self._link = None
+            if self._link_cache is not None:
+                self._link_cache.async_forget(self.device_path)
+            raise ConnectionError("modem not answering, the serial settings will be tested again")
+        imei = await async_read_imei(modem)
+
+        # The same path may lead to another modem after a reconnect
+        if self.capabilities is None or (imei is not None and self.capabilities.imei != imei):
+            cached = await self._capability_cache.async_get(imei) if self._capability_cache and imei else None
+            if cached is None:
+                _LOGGER.debug(f"Probing the capabilities of {self.device_path}...")
+                cached = await async_probe(modem, imei)
+                if self._capability_cache is not None and imei is not None:
+                    self._capability_cache.async_set(imei, cached)
+            self.capabilities = cached
+
+        modem.capabilities = self.capabilities
+
+    async def _disconnect(self) -> None:
+        if self.modem is None:
+            return
+
+        _LOGGER.debug(f"Closing connection to {self.device_path}...")
+        modem, self.modem = self.modem, None
+        try:
+            await modem.close()
+        except OSError as e:
+            _LOGGER.debug(f"Error while closing {self.device_path}: {e}")
+
+
+@callback
+def async_get_session(hass: HomeAssistant, device_path: str) -> ModemSession:
+    """Return the shared session for the device, creating it on first use."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if (sessions := data.get("sessions")) is None:
+        sessions = data["sessions"] = {}
+
+        async def _close_sessions(_event: Event) -> None:
+            await aio.gather(*(s.close() for s in sessions.values()))
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _close_sessions)
+
+    if (session := sessions.get(device_path)) is None:
+        session = sessions[device_path] = ModemSession(
+            device_path, async_get_capability_cache(hass), async_get_link_cache(hass)
+        )
+        session.delivery.subscribe(partial(async_fire_delivery_event, hass))
+        session.async_start_monitor(hass)
+
+    return session
@@ -0,0 +1,323 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""SMS-SUBMIT PDU encoding, SMS-DELIVER and SMS-STATUS-REPORT decoding (3GPP TS 23.040) with the GSM 03.38 alphabet.
+
+Pure functions without I/O or Home Assistant imports, so they can be tested and benchmarked offline.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from ..at_response import StatusReport
+
+# GSM 03.38 default alphabet, indexed by septet value; 0x1B escapes to the extension table
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞ\x1bÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM7_EXTENSION = {
+    "\f": 0x0A, "^": 0x14, "{": 0x28, "}": 0x29, "\\": 0x2F,
+    "[": 0x3C, "~": 0x3D, "]": 0x3E, "|": 0x40, "€": 0x65,
+}
+GSM7_ESCAPE = 0x1B
+
+# Precomputed char -> septets lookup, extension chars take two septets
+_GSM7_ENCODE: dict[str, bytes] = {
+    **{char: bytes((code,)) for code, char in enumerate(GSM7_BASIC) if code != GSM7_ESCAPE},
+    **{char: bytes((GSM7_ESCAPE, code)) for char, code in GSM7_EXTENSION.items()},
+}
+_GSM7_DECODE_EXTENSION = {code: char for char, code in GSM7_EXTENSION.items()}
+
+DCS_GSM7 = 0x00
+DCS_UCS2 = 0x08
+ALPHABET_GSM7 = 0
+ALPHABET_8BIT = 1
+ALPHABET_UCS2 = 2
+
+# Single message payload limits, and per part once a concatenation header takes its share
+GSM7_SINGLE_SEPTETS = 160
+GSM7_PART_SEPTETS = 153
+UCS2_SINGLE_OCTETS = 140
+UCS2_PART_OCTETS = 134
+
+FIRST_OCTET_SUBMIT = 0x01
+FIRST_OCTET_VP_RELATIVE = 0x10
+FIRST_OCTET_SRR = 0x20
+FIRST_OCTET_UDHI = 0x40
+
+FIRST_OCTET_MTI_MASK = 0x03
+FIRST_OCTET_DELIVER = 0x00
+FIRST_OCTET_STATUS_REPORT = 0x02
+
+# Concatenated short message information elements, with an 8-bit and a 16-bit reference
+IEI_CONCAT_8BIT = 0x00
+IEI_CONCAT_16BIT = 0x08
+
+TYPE_INTERNATIONAL = 0x91
+# Type of number bits of the address type, 0x50 being an alphanumeric sender
+TYPE_OF_NUMBER_MASK = 0x70
+TYPE_ALPHANUMERIC = 0x50
+VALIDITY_4_DAYS = 0xAA
+
+
+@dataclass(frozen=True)
+class DeliverPdu:
+    """A received message, or one part of it."""
+
+    # Phone number, or name of an alphanumeric sender
+    sender: str
+    text: str
+    # TP-SCTS, when the SMSC received the message
+    timestamp: datetime | None
+    # (reference, part count, part number) of a concatenated message, None for a single one
+    concat: tuple[int, int, int] | None = None
+
+
+@dataclass(frozen=True)
+class SubmitPdu:
+    # Hex string to send after AT+CMGS=<tpdu_length>, prefixed by 00 to use the SIM's SMSC
+    hex: str
+    # Length in octets of the TPDU, the SMSC prefix excluded
+    tpdu_length: int
+
+
+def encode_gsm7(text: str) -> bytes | None:
+    """Map text to GSM 7-bit septets (one per byte), None if it has a character outside the alphabet."""
+    try:
+        return b"".join([_GSM7_ENCODE[char] for char in text])
+    except KeyError:
+        return None
+
+
+def decode_gsm7(septets: bytes) -> str:
+    chars = []
+    escaped = False
+    for septet in septets:
+        if escaped:
+            chars.append(_GSM7_DECODE_EXTENSION.get(septet, " "))
+            escaped = False
+        elif septet == GSM7_ESCAPE:
+            escaped = True
+        else:
+            chars.append(GSM7_BASIC[septet])
+    return "".join(chars)
+
+
+def pack_septets(septets: bytes, padding_bits: int = 0) -> bytes:
+    """Pack 7-bit values into octets, least significant bits first, after padding_bits fill bits."""
+    if not septets:
+        return b""
+
+    value = int.from_bytes(_spread(septets), "little")
+    total_bits = len(septets) * 7 + padding_bits
+    return (value << padding_bits).to_bytes((total_bits + 7) // 8, "little")
+
+
+def unpack_septets(octets: bytes, count: int, padding_bits: int = 0) -> bytes:
+    value = int.from_bytes(octets, "little") >> padding_bits
+    return bytes((value >> (7 * i)) & 0x7F for i in range(count))
+
+
+def _spread(septets: bytes) -> bytes:
+    # Joins septets into a bit string 8 at a time: 8 septets fit exactly in 7 octets
+    out = bytearray()
+    for start in range(0, len(septets), 8):
+        chunk = 0
+        for i, septet in enumerate(septets[start:start + 8]):
+            chunk |= septet << (7 * i)
+        out += chunk.to_bytes(7, "little")
+    return bytes(out)
+
+
+def split_gsm7(septets: bytes) -> list[bytes]:
+    if len(septets) <= GSM7_SINGLE_SEPTETS:
+        return [septets]
+
+    parts = []
+    while septets:
+        size = GSM7_PART_SEPTETS
+        # Never separate an escape from the extension character it introduces
+        if len(septets) > size and septets[size - 1] == GSM7_ESCAPE and not _escaped_at(septets, size - 1):
+            size -= 1
+        parts.append(septets[:size])
+        septets = septets[size:]
+    return parts
+
+
+def _escaped_at(septets: bytes, index: int) -> bool:
+    # True if septets[index] is itself the extension character of a preceding escape
+    escapes = 0
+    while index > 0 and septets[index - 1] == GSM7_ESCAPE:
+        escapes += 1
+        index -= 1
+    return escapes % 2 == 1
+
+
+def split_ucs2(text: str) -> list[bytes]:
+    encoded = text.encode("utf-16-be")
+    if len(encoded) <= UCS2_SINGLE_OCTETS:
+        return [encoded]
+
+    parts = []
+    while encoded:
+        size = UCS2_PART_OCTETS
+        # Keep surrogate pairs together
+        if len(encoded) > size and 0xD8 <= encoded[size - 2] <= 0xDB:
+            size -= 2
+        parts.append(encoded[:size])
+        encoded = encoded[size:]
+    return parts
+
+
+def encode_address(phone_number: str) -> bytes:
+    """Encode an international number as TP-DA: digit count, type and swapped BCD digits."""
+    digits = phone_number.lstrip("+")
+    padded = digits + "F" * (len(digits) % 2)
+    swapped = "".join(padded[i + 1] + padded[i] for i in range(0, len(padded), 2))
+    return bytes((len(digits), TYPE_INTERNATIONAL)) + bytes.fromhex(swapped)
+
+
+def decode_address(octets: bytes, digits: int) -> str:
+    """Decode an address from its type on, digits being its length in semi-octets."""
+    if octets[0] & TYPE_OF_NUMBER_MASK == TYPE_ALPHANUMERIC:
+        return decode_gsm7(unpack_septets(octets[1:], digits * 4 // 7))
+    swapped = octets[1:1 + (digits + 1) // 2].hex().upper()
+    number = "".join(swapped[i + 1] + swapped[i] for i in range(0, len(swapped), 2))[:digits]
+    return f"+{number}" if octets[0] == TYPE_INTERNATIONAL else number
+
+
+def decode_status_report(pdu_hex: str) -> StatusReport | None:
+    """Decode the SMS-STATUS-REPORT following a +CDS: <length> line in PDU mode."""
+    try:
+        pdu = bytes.fromhex(pdu_hex)
+        # Skip the SMSC address, then TP-MTI, TP-MR and TP-RA
+        tpdu = pdu[1 + pdu[0]:]
+        if tpdu[0] & FIRST_OCTET_MTI_MASK != FIRST_OCTET_STATUS_REPORT:
+            return None
+        reference, digits = tpdu[1], tpdu[2]
+        address_end = 4 + (digits + 1) // 2
+        recipient = decode_address(tpdu[3:address_end], digits)
+        # TP-SCTS and TP-DT, 7 octets each, come before TP-ST
+        status = tpdu[address_end + 14]
+    except (ValueError, IndexError):
+        return None
+    return StatusReport(reference=reference, recipient=recipient, status=status)
+
+
+def decode_timestamp(octets: bytes) -> datetime | None:
+    """Decode a 7 octet TP-SCTS: swapped BCD date and time, then the offset from UTC in quarters of an hour."""
+    digits = [(octet & 0x0F) * 10 + (octet >> 4) for octet in octets[:6]]
+    quarters = (octets[6] & 0x07) * 10 + (octets[6] >> 4)
+    if octets[6] & 0x08:
+        quarters = -quarters
+    try:
+        return datetime(2000 + digits[0], *digits[1:], tzinfo=timezone(timedelta(minutes=15 * quarters)))
+    except ValueError:
+        return None
+
+
+def decode_deliver_pdu(pdu_hex: str) -> DeliverPdu | None:
+    """Decode the SMS-DELIVER PDU listed by AT+CMGL or read by AT+CMGR in PDU mode."""
+    try:
+        pdu = bytes.fromhex(pdu_hex)
+        tpdu = pdu[1 + pdu[0]:]
+        first_octet = tpdu[0]
+        if first_octet & FIRST_OCTET_MTI_MASK != FIRST_OCTET_DELIVER:
+            return None
+
+        digits = tpdu[1]
+        address_end = 3 + (digits + 1) // 2
+        sender = decode_address(tpdu[2:address_end], digits)
+        dcs = tpdu[address_end + 1]
+        timestamp = decode_timestamp(tpdu[address_end + 2:address_end + 9])
+        udl = tpdu[address_end + 9]
+        user_data = tpdu[address_end + 10:]
+
+        header = user_data[1:1 + user_data[0]] if first_octet & FIRST_OCTET_UDHI else b""
+        header_octets = len(header) + 1 if header else 0
+        alphabet = _alphabet(dcs)
+        if alphabet == ALPHABET_GSM7:
+            # The header is padded to a septet boundary, so the text starts at a whole septet
+            text = decode_gsm7(unpack_septets(user_data, udl)[(header_octets * 8 + 6) // 7:])
+        elif alphabet == ALPHABET_UCS2:
+            text = user_data[header_octets:udl].decode("utf-16-be", errors="replace")
+        else:
+            text = user_data[header_octets:udl].hex().upper()
+    except (ValueError, IndexError):
+        return None
+
+    return DeliverPdu(sender=sender, text=text, timestamp=timestamp, concat=_concat_header(header))
+
+
+def _alphabet(dcs: int) -> int:
+    # See 3GPP TS 23.038 chapter 4, classes and message waiting indications only matter for the alphabet
+    if dcs & 0xC0 == 0x00:
+        return (dcs >> 2) & 0x03
+    if dcs & 0xF0 == 0xF0:
+        return ALPHABET_8BIT if dcs & 0x04 else ALPHABET_GSM7
+    if dcs & 0xF0 == 0xE0:
+        return ALPHABET_UCS2
+    return ALPHABET_GSM7
+
+
+def _concat_header(header: bytes) -> tuple[int, int, int] | None:
+    position = 0
+    while position + 2 <= len(header):
+        iei, length = header[position], header[position + 1]
+        data = header[position + 2:position + 2 + length]
+        if iei == IEI_CONCAT_8BIT and length == 3:
+            return data[0], data[1], data[2]
+        if iei == IEI_CONCAT_16BIT and length == 4:
+            return (data[0] << 8) | data[1], data[2], data[3]
+        position += 2 + length
+    return None
+
+
+def build_submit_pdus(
+        phone_number: str, text: str, reference: int = 0, status_report: bool = False) -> list[SubmitPdu]:
+    """Encode text as one or more SMS-SUBMIT PDUs, in GSM 7-bit if possible, UCS-2 otherwise.
+
+    Messages too long for a single SMS get a concatenation header with the given 8-bit reference.
+    """
+    if (septets := encode_gsm7(text)) is not None:
+        dcs = DCS_GSM7
+        parts = split_gsm7(septets)
+    else:
+        dcs = DCS_UCS2
+        parts = split_ucs2(text)
+
+    first_octet = FIRST_OCTET_SUBMIT | FIRST_OCTET_VP_RELATIVE
+    if status_report:
+        first_octet |= FIRST_OCTET_SRR
+    if len(parts) > 1:
+        first_octet |= FIRST_OCTET_UDHI
+
+    address = encode_address(phone_number)
+    pdus = []
+    for seq, part in enumerate(parts, start=1):
+        udh = b""
+        if len(parts) > 1:
+            # IEI 00: concatenated short message, 8-bit reference
+            udh = bytes((5, 0x00, 3, reference & 0xFF, len(parts), seq))
+
+        if dcs == DCS_GSM7:
+            # The header is followed by fill bits up to the next septet boundary
+            udh_septets = (len(udh) * 8 + 6) // 7
+            padding = udh_septets * 7 - len(udh) * 8
+            user_data = udh + pack_septets(part, padding)
+            udl = udh_septets + len(part)
+        else:
+            user_data = udh + part
+            udl = len(user_data)
+
+        tpdu = (
+            bytes((first_octet, 0x00)) + address
+            + bytes((0x00, dcs, VALIDITY_4_DAYS, udl)) + user_data
+        )
+        pdus.append(SubmitPdu(hex=f"00{tpdu.hex().upper()}", tpdu_length=len(tpdu)))
+
+    return pdus
@@ -0,0 +1,40 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import random
+
+from ..const import _LOGGER
+from ..modem import Modem
+from .pdu import build_submit_pdus
+from .sms_sender import SmsSender
+
+
+class PduSmsSender(SmsSender):
+    """Sends SMS in PDU mode: any Unicode text, split into concatenated parts when too long."""
+
+    # AT+CMGF value: 0 for PDU mode
+    message_format = 0
+    supports_unicode = True
+
+    def __init__(self, delivery_reports: bool = False):
+        super().__init__(delivery_reports)
+        self._reference = random.randrange(256)
+
+    async def _submit(self, modem: Modem, phone_number: str, message: str) -> None:
+        clean_number = phone_number.replace("+", "")
+        self._reference = (self._reference + 1) % 256
+        pdus = build_submit_pdus(
+            clean_number, message, reference=self._reference, status_report=self.delivery_reports
+        )
+        _LOGGER.debug(f"Initiating SMS to +{clean_number} in {len(pdus)} part(s)...")
+
+        if len(pdus) > 1:
+            # Keep the link to the SMSC open between parts, optional so errors are ignored
+            await modem.request("AT+CMMS=1", timeout=2)
+
+        track = self._expect_reports(modem, clean_number, parts=len(pdus))
+        for pdu in pdus:
+            track(await self._transmit(modem, f"AT+CMGS={pdu.tpdu_length}", pdu.hex))
+
+        _LOGGER.info(f"SMS sent successfully to +{clean_number}")
@@ -1,61 +1,140 @@
 import asyncio
+from collections.abc import Callable
 from homeassistant.exceptions import HomeAssistantError
-from ..const import _LOGGER
+from ..at_response import PROMPT_RESULTS, AtResponse, FinalResult, parse_cmgs
+from ..const import _LOGGER, AT_MESSAGE_INDICATIONS
+from ..metrics import DATA_NAME
 from ..modem import Modem
 
+# Text mode SMS-SUBMIT parameters: <fo> 17 for a relative validity period, 49 to also request a status report
+CSMP_DEFAULT = "AT+CSMP=17,167,0,0"
+CSMP_STATUS_REPORT = "AT+CSMP=49,167,0,0"
+
 class SmsSender:
+    # AT+CMGF value: 1 for text mode
+    message_format = 1
+    # Text mode only takes what the modem's character set can represent
+    supports_unicode = False
+    # Fallback pauses, only used when the modem doesn't signal it is ready
+    reset_fallback_sec = 1
+    prompt_fallback_sec = 2
+
+    def __init__(self, delivery_reports: bool = False):
+        # Whether to ask the SMSC for status reports, matched to the messages by the modem's delivery tracker
+        self.delivery_reports = delivery_reports
+
     async def send(self, modem: Modem, phone_number: str, message: str) -> None:
+        await self.prepare(modem)
+        await self.submit(modem, phone_number, message)
+
+    async def prepare(self, modem: Modem) -> None:
+        """Put the modem in a known state and switch it to the sender's message format."""
+        with modem.metrics.phase("sms_prepare"):
+            await self._prepare(modem)
+
+    async def submit(self, modem: Modem, phone_number: str, message: str) -> None:
+        """Send a single message, the modem must have been prepared."""
+        with modem.metrics.phase("sms_submit"):
+            await self._submit(modem, phone_number, message)
+
+    async def send_batch(
+            self, modem: Modem, phone_numbers: list[str], message: str,
+            skip: Callable[[str], bool] | None = None,
+    ) -> list[BaseException | None]:
+        """Send the message to every number, preparing the modem only once.
+
+        A failure for one number doesn't stop the others; returns the error per number, None if sent.
+        A number skip returns True for when its turn comes, like one cancelled meanwhile, gets a CancelledError.
+        """
+        await self.prepare(modem)
+
+        results = []
+        for phone_number in phone_numbers:
+            if skip is not None and skip(phone_number):
+                _LOGGER.debug(f"Skipping SMS to +{phone_number}")
+                results.append(asyncio.CancelledError())
+                continue
+            try:
+                await self.submit(modem, phone_number, message)
+            except HomeAssistantError as e:
+                _LOGGER.error(f"Failed to send SMS to +{phone_number}: {e}")
+                results.append(e)
+            else:
+                results.append(None)
+
+        return results
+
+    async def _prepare(self, modem: Modem) -> None:
         # 1. Resetare buffer (Escape) - Lecția din shell
-        _LOGGER.debug("Sending Escape/Cancel to clear modem buffer")
-        await modem.execute_at("\x1B", timeout=2, end_markers=[])
-        await asyncio.sleep(1)
+        if not await modem.reset():
+            await asyncio.sleep(self.reset_fallback_sec)
 
         # 2. Setare mod text
-        lines = await modem.execute_at("AT+CMGF=1", timeout=5, end_markers=["OK", "ERROR", "+CME ERROR"])
-        reply = " ".join(lines)
-        if "OK" not in reply:
-            _LOGGER.warning(f"Text mode might not be set, but continuing: {reply}")
-        
-        await asyncio.sleep(1)
-
-        # 3. Trimitere număr - LOGICA "SHELL" (Ignorăm timeout-ul promptului)
+        if not await modem.setup(f"AT+CMGF={self.message_format}", timeout=5):
+            _LOGGER.warning("Message format might not be set, but continuing")
+
+        if self.delivery_reports:
+            await self._request_status_reports(modem)
+        elif self.message_format == 1 and modem.applied("AT+CSMP") == CSMP_STATUS_REPORT:
+            # Left by a service with delivery reports on the same modem, it applies to every SMS sent
+            await modem.setup(CSMP_DEFAULT)
+
+    async def _request_status_reports(self, modem: Modem) -> None:
+        if not await modem.setup(AT_MESSAGE_INDICATIONS):
+            _LOGGER.warning("Modem rejected AT+CNMI, SMS delivery reports won't be received")
+        if self.message_format == 1 and not await modem.setup(CSMP_STATUS_REPORT):
+            _LOGGER.warning("Modem rejected AT+CSMP, SMS delivery reports won't be requested")
+
+    def _expect_reports(self, modem: Modem, phone_number: str, parts: int) -> Callable[[AtResponse], None]:
+        """Return the function handing the +CMGS reference of each part sent to the modem's delivery tracker."""
+        if not self.delivery_reports or modem.delivery is None:
+            return lambda _response: None
+
+        add_reference = modem.delivery.expect(phone_number, parts)
+
+        def _track(response: AtResponse) -> None:
+            if (reference := parse_cmgs(response.first("+CMGS:") or "")) is None:
+                _LOGGER.debug(f"No message reference for the SMS to +{phone_number}, its delivery can't be tracked")
+                return
+            add_reference(reference)
+
+        return _track
+
+    async def _submit(self, modem: Modem, phone_number: str, message: str) -> None:
         clean_number = phone_number.replace("+", "")
         _LOGGER.debug(f"Initiating SMS to +{clean_number}...")
-        
-        try:
-            # Reducem timeout-ul; pe Huawei, promptul ">" nu vine cu newline, deci va da timeout oricum
-            lines = await modem.execute_at(
-                f'AT+CMGS="+{clean_number}"',
-                timeout=3, 
-                end_markers=[">", "ERROR", "+CME ERROR"]
-            )
-            reply = " ".join(lines)
-        except Exception:
-            # În shell nu verificăm răspunsul, deci nici aici nu ne oprim dacă e doar timeout
-            reply = ""
-            _LOGGER.debug("Prompt '>' not detected via newline, proceeding by faith (shell style)")
-
-        if "ERROR" in reply:
-            raise HomeAssistantError(f"Modem rejected SMS command: {reply}")
-
-        # 4. PAUZA CRITICĂ (2 secunde) - Exact ca în shell-ul tău
-        # Îi oferim modemului timp să deschidă bufferul de text, chiar dacă nu am "văzut" simbolul >
-        await asyncio.sleep(2)
-
-        # 5. Trimitere mesaj cu terminatorul Ctrl+Z (\x1A)
-        _LOGGER.debug(f"Sending message body: {message}")
-        lines = await modem.execute_at(
-            message,
-            timeout=25,
-            end_markers=["+CMGS:", "OK", "ERROR", "+CME ERROR"],
-            terminator=Modem.SMS_TERMINATOR,
-        )
-        reply = " ".join(lines)
-        _LOGGER.debug(f"Modem final reply: {reply}")
-        
-        if "+CMGS" not in reply and "OK" not in reply:
-            # Încercăm un reset la final în caz de eșec
-            await modem.execute_at("\x1B", timeout=1, end_markers=[])
-            raise HomeAssistantError(f"Failed to send SMS body: {reply}")
-
-        _LOGGER.info(f"SMS sent successfully to +{clean_number}")
\ No newline at end of file
+
+        track = self._expect_reports(modem, clean_number, parts=1)
+        track(await self._transmit(modem, f'AT+CMGS="+{clean_number}"', message))
+        _LOGGER.info(f"SMS sent successfully to +{clean_number}")
+
+    async def _transmit(self, modem: Modem, command: str, body: str) -> AtResponse:
+        """Send AT+CMGS, wait for its prompt and send the body, returns the final reply."""
+        # A dialer polling the call state mustn't slip a command in between, it would end up in the message
+        async with modem.exclusive():
+            # 3. Trimitere număr și așteptare prompt ">"
+            # Modems known not to send the prompt only get the time to report an error
+            expects_prompt = modem.capabilities is None or modem.capabilities.sms_prompt
+            timeout = 5 if expects_prompt else self.prompt_fallback_sec
+            response = await modem.request(command, timeout=timeout, end_markers=PROMPT_RESULTS, prompt=">")
+
+            if response.error is not None:
+                raise HomeAssistantError(f"Modem rejected SMS command: {response.error}")
+
+            if response.result != FinalResult.PROMPT and expects_prompt:
+                # Some modems never send the prompt; give them time to open the text buffer anyway
+                _LOGGER.debug("Prompt '>' not detected, proceeding after a fixed pause (shell style)")
+                await asyncio.sleep(self.prompt_fallback_sec)
+
+            # 4. Trimitere mesaj cu terminatorul Ctrl+Z (\x1A)
+            _LOGGER.debug(f"Sending message body: {body}")
+            response = await modem.request(body, timeout=25, terminator=Modem.SMS_TERMINATOR, record_as=DATA_NAME)
+            _LOGGER.debug(f"Modem final reply: {response}")
+
+            # A +CMGS: <mr> line is proof enough, even if the OK after it got lost
+            if not response.ok and parse_cmgs(response.first("+CMGS:") or "") is None:
+                # Încercăm un reset la final în caz de eșec
+                await modem.reset(timeout=1)
+                raise HomeAssistantError(f"Failed to send SMS body: {response}")
+
+            return response
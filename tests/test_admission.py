@@ -0,0 +1,44 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import asyncio as aio
+
+from homeassistant.core import CoreState, HomeAssistant
+
+from custom_components.gsm_call.admission import AdmissionControl
+
+
+def _run_with_control(tmp_path, scenario, **kwargs) -> list[tuple[str, str]]:
+    async def _main() -> list[tuple[str, str]]:
+        hass = HomeAssistant(str(tmp_path))
+        hass.set_state(CoreState.running)
+        summaries = []
+        control = AdmissionControl(hass, send_summary=lambda target, text: summaries.append((target, text)), **kwargs)
+        try:
+            await scenario(control)
+        finally:
+            await hass.async_stop(force=True)
+        return summaries
+
+    return aio.run(_main())
+
+
+def test_duplicates_get_no_summary(tmp_path):
+    async def scenario(control: AdmissionControl) -> None:
+        assert control.admit("111", "Water leak") == "Water leak"
+        assert control.admit("111", "Water leak") is None
+        assert control.admit("111", "Water leak") is None
+        await aio.sleep(.4)
+
+    assert _run_with_control(tmp_path, scenario, per_target=None, period_sec=60, dedup_window_sec=.2) == []
+
+
+def test_rate_limited_alerts_are_summarized(tmp_path):
+    async def scenario(control: AdmissionControl) -> None:
+        assert control.admit("111", "Water leak") == "Water leak"
+        assert control.admit("111", "Smoke") is None
+        await aio.sleep(.6)
+
+    summaries = _run_with_control(tmp_path, scenario, per_target=1, period_sec=.3, dedup_window_sec=0)
+    assert summaries == [("111", "1 more alert, latest: Smoke")]
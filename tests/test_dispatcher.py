@@ -0,0 +1,50 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import asyncio as aio
+
+from fake_modem import FakeModem, FakeModemConfig
+from homeassistant.core import CoreState, HomeAssistant
+
+from custom_components.gsm_call.const import Priority
+from custom_components.gsm_call.dispatcher import (DispatchQueue,
+                                                   ModemDispatcher)
+from custom_components.gsm_call.session import ModemSession
+
+
+def test_cancel_makes_room_in_full_backlog(tmp_path):
+    async def _main() -> None:
+        hass = HomeAssistant(str(tmp_path))
+        hass.set_state(CoreState.running)
+        fake_modem = FakeModem(FakeModemConfig(latency_sec=.01))
+        session = ModemSession(fake_modem.start())
+        queue = DispatchQueue(hass, max_backlog=1)
+        dispatcher = ModemDispatcher(queue, [session])
+        release = aio.Event()
+
+        async def handler(_modem, jobs):
+            await release.wait()
+            return [None] * len(jobs)
+
+        try:
+            running = await dispatcher.enqueue(handler, "111", "", Priority.NORMAL)
+            while queue.depth:
+                await aio.sleep(.01)
+            queued = await dispatcher.enqueue(handler, "222", "", Priority.NORMAL)
+            # The backlog is full until the queued job is cancelled
+            blocked = aio.ensure_future(dispatcher.enqueue(handler, "333", "", Priority.NORMAL))
+            await aio.sleep(.1)
+            assert not blocked.done()
+
+            assert dispatcher.cancel(queued)
+            last = await aio.wait_for(blocked, 1)
+            release.set()
+            assert await aio.wait_for(aio.gather(running, last), 5) == [None, None]
+        finally:
+            await queue.stop()
+            await session.close()
+            fake_modem.stop()
+            await hass.async_stop(force=True)
+
+    aio.run(_main())
@@ -0,0 +1,98 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from custom_components.gsm_call.sms.pdu import (GSM7_ESCAPE,
+                                                GSM7_PART_SEPTETS,
+                                                UCS2_PART_OCTETS,
+                                                build_submit_pdus,
+                                                decode_deliver_pdu,
+                                                decode_gsm7, encode_gsm7,
+                                                pack_septets, split_gsm7,
+                                                split_ucs2, unpack_septets)
+
+
+def test_pack_septets():
+    # The classic example of the GSM 03.38 packing
+    assert pack_septets(encode_gsm7("hellohello")).hex().upper() == "E8329BFD4697D9EC37"
+    assert decode_gsm7(unpack_septets(bytes.fromhex("E8329BFD4697D9EC37"), 10)) == "hellohello"
+
+
+def test_pack_septets_padding():
+    packed = pack_septets(encode_gsm7("Hi"), 1)
+    assert unpack_septets(packed, 2, 1) == encode_gsm7("Hi")
+
+
+def test_encode_extension_characters():
+    assert encode_gsm7("€[") == bytes((GSM7_ESCAPE, 0x65, GSM7_ESCAPE, 0x3C))
+    assert encode_gsm7("ț") is None
+
+
+def test_single_submit_pdu():
+    [pdu] = build_submit_pdus("+46708251358", "hellohello")
+    assert pdu.hex == "0011000B916407281553F80000AA0AE8329BFD4697D9EC37"
+    assert pdu.tpdu_length == 23
+
+
+def test_split_gsm7_keeps_escape_with_extension_character():
+    # The escape of the euro sign would be the last septet of the first part
+    septets = encode_gsm7("a" * (GSM7_PART_SEPTETS - 1) + "€" + "b" * 20)
+    parts = split_gsm7(septets)
+    assert len(parts[0]) == GSM7_PART_SEPTETS - 1
+    assert parts[1][:2] == bytes((GSM7_ESCAPE, 0x65))
+    assert b"".join(parts) == septets
+    assert "".join(decode_gsm7(part) for part in parts) == "a" * (GSM7_PART_SEPTETS - 1) + "€" + "b" * 20
+
+
+def test_split_gsm7_fills_parts():
+    parts = split_gsm7(encode_gsm7("a" * 161))
+    assert [len(part) for part in parts] == [GSM7_PART_SEPTETS, 8]
+
+
+def test_split_ucs2_keeps_surrogate_pair():
+    # 66 two-octet characters, then an emoji whose high surrogate would end the first part
+    text = "ă" * 66 + "😀" + "ă" * 10
+    parts = split_ucs2(text)
+    assert len(parts[0]) == UCS2_PART_OCTETS - 2
+    assert parts[1][:4] == "😀".encode("utf-16-be")
+    assert "".join(part.decode("utf-16-be") for part in parts) == text
+
+
+def test_concatenated_submit_pdus():
+    pdus = build_submit_pdus("+40711111111", "a" * 200, reference=0x42)
+    assert len(pdus) == 2
+    udls = []
+    for seq, pdu in enumerate(pdus, start=1):
+        tpdu = bytes.fromhex(pdu.hex)[1:]
+        # SMS-SUBMIT with a relative validity period and a user data header
+        assert tpdu[0] == 0x51
+        assert tpdu[14:20] == bytes((5, 0x00, 3, 0x42, 2, seq))
+        assert pdu.tpdu_length == len(tpdu)
+        udls.append(tpdu[13])
+    # 7 septets of header and fill bits, then the text
+    assert udls == [7 + GSM7_PART_SEPTETS, 7 + 200 - GSM7_PART_SEPTETS]
+
+
+def test_ucs2_submit_pdu():
+    [pdu] = build_submit_pdus("+40711111111", "Șoc")
+    tpdu = bytes.fromhex(pdu.hex)[1:]
+    assert tpdu[11] == 0x08
+    assert tpdu[13] == 6
+    assert tpdu[14:].decode("utf-16-be") == "Șoc"
+
+
+def test_decode_deliver_pdu():
+    message = decode_deliver_pdu("07911326040000F0040B911346610089F60000208062917314080CC8F71D14969741F977FD07")
+    assert message.sender == "+31641600986"
+    assert message.text == "How are you?"
+    assert message.timestamp.replace(tzinfo=None).isoformat() == "2002-08-26T19:37:41"
+    assert message.concat is None
+
+
+def test_decode_concatenated_deliver_pdu():
+    # SMS-DELIVER with a user data header: part 1 of 2, 8-bit reference 0x42, then "Hi" after one fill bit
+    user_data = bytes((5, 0x00, 3, 0x42, 2, 1)) + pack_septets(encode_gsm7("Hi"), 1)
+    pdu = f"00440B911346610089F600002080629173140809{user_data.hex()}"
+    message = decode_deliver_pdu(pdu)
+    assert message.text == "Hi"
+    assert message.concat == (0x42, 2, 1)
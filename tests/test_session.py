@@ -0,0 +1,149 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Calls and SMS through a ModemSession against the simulated modem of tools/fake_modem.py."""
+
+import asyncio as aio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+from fake_modem import FakeModem, FakeModemConfig
+from homeassistant.core import CoreState, HomeAssistant
+
+from custom_components.gsm_call.calls.at_dialer import ATDialer
+from custom_components.gsm_call.calls.call_state import CallState
+from custom_components.gsm_call.const import EndedReason, Priority
+from custom_components.gsm_call.dispatcher import (DispatchQueue,
+                                                   ModemDispatcher)
+from custom_components.gsm_call.notify import GsmSmsNotificationService
+from custom_components.gsm_call.profiles import ModemProfile
+from custom_components.gsm_call.session import ModemSession
+from custom_components.gsm_call.sms.sms_sender import SmsSender
+
+NUMBER = "+40711111111"
+
+
+def _run(config: FakeModemConfig, scenario: Callable[[FakeModem, ModemSession], Awaitable[Any]]) -> Any:
+    async def _main() -> Any:
+        fake_modem = FakeModem(config)
+        session = ModemSession(fake_modem.start())
+        try:
+            return await scenario(fake_modem, session)
+        finally:
+            await session.close()
+            fake_modem.stop()
+
+    return aio.run(_main())
+
+
+def _dial_commands(fake_modem: FakeModem) -> list[str]:
+    """The dial, hangup and SMS commands from ATD on, the capability probe sends AT+CMGS before."""
+    commands = fake_modem.commands[next(i for i, c in enumerate(fake_modem.commands) if c.startswith("ATD")):]
+    return [command for command in commands if command.startswith(("ATD", "AT+CMGS", "AT+CHUP", "ATH"))]
+
+
+def test_dial_answered():
+    async def scenario(fake_modem: FakeModem, session: ModemSession) -> None:
+        async with session.acquire() as modem:
+            assert await ATDialer(5, 1).dial(modem, NUMBER) == EndedReason.ANSWERED
+        assert fake_modem._call_state is None
+        assert _dial_commands(fake_modem)[:2] == ["ATD+40711111111;", "AT+CHUP"]
+
+    _run(FakeModemConfig(latency_sec=.01, ring_after_sec=.2, outcome_after_sec=.3), scenario)
+
+
+def test_dial_not_answered():
+    async def scenario(fake_modem: FakeModem, session: ModemSession) -> None:
+        async with session.acquire() as modem:
+            assert await ATDialer(1, 1).dial(modem, NUMBER) == EndedReason.NOT_ANSWERED
+        assert fake_modem._call_state is None
+
+    _run(FakeModemConfig(latency_sec=.01, ring_after_sec=.2, outcome="no_answer"), scenario)
+
+
+def test_dial_answered_with_vendor_urcs():
+    profile = ModemProfile(
+        "quectel",
+        call_state_urcs=(("VOICE CALL: BEGIN", CallState.ANSWERED), ("VOICE CALL: END", CallState.ENDED)),
+    )
+
+    async def scenario(fake_modem: FakeModem, session: ModemSession) -> None:
+        async with session.acquire() as modem:
+            assert await ATDialer(3, 1, profile).dial(modem, NUMBER) == EndedReason.ANSWERED
+        assert fake_modem._call_state is None
+
+    _run(FakeModemConfig(latency_sec=.01, ring_after_sec=.2, outcome_after_sec=.3, quectel_urcs=True), scenario)
+
+
+def test_sms_during_call():
+    async def scenario(fake_modem: FakeModem, session: ModemSession) -> None:
+        async with session.acquire() as modem:
+            call = aio.ensure_future(ATDialer(3, 1).dial(modem, NUMBER))
+            await aio.wait_for(modem.call_active.wait(), 5)
+            await SmsSender().send(modem, "40722222222", "Water leak detected!")
+            assert not call.done()
+            assert await call == EndedReason.NOT_ANSWERED
+        assert _dial_commands(fake_modem)[:3] == ["ATD+40711111111;", 'AT+CMGS="+40722222222"', "AT+CHUP"]
+
+    _run(FakeModemConfig(latency_sec=.01, ring_after_sec=.2, outcome="no_answer", sms_submit_sec=.1), scenario)
+
+
+def test_cancel_while_dialing():
+    async def scenario(fake_modem: FakeModem, session: ModemSession) -> None:
+        async with session.acquire() as modem:
+            call = aio.ensure_future(ATDialer(10, 1).dial(modem, NUMBER))
+            # The modem is still to reply to ATD
+            await aio.sleep(.5)
+            assert not modem.call_active.is_set()
+            call.cancel()
+            with pytest.raises(aio.CancelledError):
+                await call
+        assert fake_modem._call_state is None
+        assert _dial_commands(fake_modem)[:2] == ["ATD+40711111111;", "AT+CHUP"]
+
+    _run(FakeModemConfig(latency_sec=.01, dial_reply_sec=5, outcome="no_answer"), scenario)
+
+
+def test_cancel_one_number_of_running_batch(tmp_path):
+    async def _main() -> None:
+        hass = HomeAssistant(str(tmp_path))
+        hass.set_state(CoreState.running)
+        fake_modem = FakeModem(FakeModemConfig(latency_sec=.01, sms_submit_sec=.3))
+        session = ModemSession(fake_modem.start())
+        queue = DispatchQueue(hass)
+        service = GsmSmsNotificationService(ModemDispatcher(queue, [session]), SmsSender())
+        service.hass = hass
+        try:
+            futures = [
+                await service.dispatcher.enqueue(service.handler, number, "Hi", Priority.NORMAL, batchable=True)
+                for number in ("111", "222", "333")
+            ]
+            while 'AT+CMGS="+111"' not in fake_modem.commands:
+                await aio.sleep(.05)
+            assert queue.cancel_targets({"222"}) == 1
+
+            results = await aio.gather(*futures, return_exceptions=True)
+            assert results[0] is None and results[2] is None
+            assert isinstance(results[1], aio.CancelledError)
+            assert 'AT+CMGS="+333"' in fake_modem.commands
+            assert 'AT+CMGS="+222"' not in fake_modem.commands
+        finally:
+            await queue.stop()
+            await session.close()
+            fake_modem.stop()
+            await hass.async_stop(force=True)
+
+    aio.run(_main())
+
+
+def test_status_reports_only_for_the_service_asking():
+    async def scenario(fake_modem: FakeModem, session: ModemSession) -> None:
+        async with session.acquire() as modem:
+            await SmsSender(delivery_reports=True).send(modem, "40722222222", "Tracked")
+            assert fake_modem._request_report
+            await SmsSender().send(modem, "40733333333", "Untracked")
+            assert not fake_modem._request_report
+
+    _run(FakeModemConfig(latency_sec=.01, sms_submit_sec=.1), scenario)
@@ -0,0 +1,160 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""End-to-end latency benchmarks of the dial and SMS paths against the fake modem.
+
+Needs the integration's requirements (homeassistant, pyserial-asyncio-fast), no hardware:
+
+    python tools/benchmark.py --targets 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio as aio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from custom_components.gsm_call.calls.at_dialer import ATDialer  # noqa: E402
+from custom_components.gsm_call.calls.call_state import (  # noqa: E402
+    CallState, parse_call_state)
+from custom_components.gsm_call.session import ModemSession  # noqa: E402
+from custom_components.gsm_call.sms.pdu_sender import \
+    PduSmsSender  # noqa: E402
+from custom_components.gsm_call.sms.sms_sender import SmsSender  # noqa: E402
+
+from fake_modem import FakeModem, FakeModemConfig  # noqa: E402
+
+PHONE_NUMBER = "40700000000"
+MESSAGE = "Benchmark: water leak detected in the basement!"
+
+
+async def bench_connect(modem_config: FakeModemConfig) -> dict:
+    fake = FakeModem(modem_config)
+    session = ModemSession(fake.start())
+    try:
+        start = time.perf_counter()
+        async with session.acquire():
+            connect_sec = time.perf_counter() - start
+    finally:
+        await session.close()
+        fake.stop()
+    return {"connect_sec": connect_sec}
+
+
+async def bench_call(modem_config: FakeModemConfig) -> dict:
+    fake = FakeModem(modem_config)
+    session = ModemSession(fake.start())
+    dialer = ATDialer(dial_timeout_sec=20, call_duration_sec=30)
+    try:
+        async with session.acquire() as modem:
+            start = time.perf_counter()
+            first_ring: list[float] = []
+
+            def on_urc(line: str) -> None:
+                if not first_ring and parse_call_state(line) == CallState.RINGING:
+                    first_ring.append(time.perf_counter() - start)
+
+            remove_listener = modem.add_urc_listener(on_urc)
+            try:
+                reason = await dialer.dial(modem, PHONE_NUMBER)
+            finally:
+                remove_listener()
+            total_sec = time.perf_counter() - start
+    finally:
+        await session.close()
+        fake.stop()
+
+    # The fake modem rings after a fixed delay: the overhead is what the integration adds on top of it
+    ring_sec = first_ring[0] if first_ring else None
+    return {
+        "reason": str(reason.value),
+        "time_to_first_ring_sec": ring_sec,
+        "ring_overhead_sec": ring_sec - modem_config.ring_after_sec if ring_sec is not None else None,
+        "call_total_sec": total_sec,
+        "call_overhead_sec": total_sec - modem_config.ring_after_sec - modem_config.outcome_after_sec,
+    }
+
+
+async def bench_sms(modem_config: FakeModemConfig, sender: SmsSender, targets: int) -> dict:
+    fake = FakeModem(modem_config)
+    session = ModemSession(fake.start())
+    numbers = [f"{PHONE_NUMBER[:-3]}{i:03d}" for i in range(targets)]
+    try:
+        async with session.acquire() as modem:
+            latencies = []
+            for number in numbers:
+                start = time.perf_counter()
+                await sender.send(modem, number, MESSAGE)
+                latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            errors = await sender.send_batch(modem, numbers, MESSAGE)
+            batch_sec = time.perf_counter() - start
+    finally:
+        await session.close()
+        fake.stop()
+
+    return {
+        "sender": type(sender).__name__,
+        "targets": targets,
+        "per_sms_mean_sec": statistics.mean(latencies),
+        "per_sms_max_sec": max(latencies),
+        "per_sms_overhead_sec": statistics.mean(latencies) - modem_config.sms_submit_sec,
+        "batch_total_sec": batch_sec,
+        "batch_throughput_per_min": 60 * targets / batch_sec,
+        "batch_failures": sum(error is not None for error in errors),
+    }
+
+
+async def run(args: argparse.Namespace) -> dict:
+    modem_config = FakeModemConfig(
+        latency_sec=args.latency_sec,
+        ring_after_sec=args.ring_after_sec,
+        outcome_after_sec=args.outcome_after_sec,
+        sms_submit_sec=args.sms_submit_sec,
+        bare_prompt=not args.prompt_newline,
+        call_reports=not args.no_call_reports,
+        error_rate=args.error_rate,
+    )
+
+    return {
+        "connect": await bench_connect(modem_config),
+        "call": await bench_call(modem_config),
+        "sms_text": await bench_sms(modem_config, SmsSender(), args.targets),
+        "sms_pdu": await bench_sms(modem_config, PduSmsSender(), args.targets),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", type=int, default=10, help="number of SMS recipients")
+    parser.add_argument("--latency-sec", type=float, default=0.02, help="fake modem reply latency")
+    parser.add_argument("--ring-after-sec", type=float, default=0.5)
+    parser.add_argument("--outcome-after-sec", type=float, default=0.5)
+    parser.add_argument("--sms-submit-sec", type=float, default=0.1)
+    parser.add_argument("--prompt-newline", action="store_true", help="terminate the > prompt with a newline")
+    parser.add_argument("--no-call-reports", action="store_true", help="reject AT+CLCC=1, forcing polling")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true", help="print machine readable results")
+    args = parser.parse_args()
+
+    results = aio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, metrics in results.items():
+        print(name)
+        for key, value in metrics.items():
+            print(f"  {key:28} {value:.3f}" if isinstance(value, float) else f"  {key:28} {value}")
+
+
+if __name__ == "__main__":
+    main()
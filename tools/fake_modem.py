@@ -0,0 +1,361 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""Scriptable AT modem simulator on a pseudo-terminal.
+
+Run it on its own to get a device path for Home Assistant or a terminal program:
+
+    python tools/fake_modem.py --ring-after-sec 2 --outcome decline
+
+or start it from Python with FakeModem(...).start() and point the integration at its `device_path`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio as aio
+import os
+import random
+import re
+import tty
+from dataclasses import dataclass
+
+ESC = 0x1B
+CTRL_Z = 0x1A
+
+# +CLCC <stat> values
+DIALING = 2
+RINGING = 3
+ACTIVE = 0
+
+
+@dataclass
+class FakeModemConfig:
+    # Delay before every reply
+    latency_sec: float = 0.02
+    # Call timeline after ATD: dialing, then ringing, then the outcome
+    ring_after_sec: float = 1.0
+    outcome: str = "answer"  # answer, decline, no_answer, busy
+    outcome_after_sec: float = 2.0
+    # Time before ATD is answered, some modems only reply once the callee's phone rings
+    dial_reply_sec: float = 0.0
+    # Whether AT+CLCC=1 is accepted and +CLCC/^CONF/^CONN/^CEND are reported unsolicited
+    call_reports: bool = True
+    # Report the call like a Quectel modem instead, only with VOICE CALL: BEGIN/END
+    quectel_urcs: bool = False
+    # Send the AT+CMGS prompt as "> " without a newline, like Huawei modems do
+    bare_prompt: bool = True
+    # Never send the AT+CMGS prompt at all
+    no_prompt: bool = False
+    # Time between the end of an SMS body and the +CMGS reply
+    sms_submit_sec: float = 0.3
+    # Probability of answering any command with ERROR
+    error_rate: float = 0.0
+    # Probability of not answering a command at all
+    drop_rate: float = 0.0
+    # <stat> reported by AT+CREG?/AT+CEREG?: 1 registered, 0 not registered, 3 denied...
+    registration: int = 1
+    # Identity reported to AT+CGMI/AT+CGMM/AT+CGSN and ATI
+    manufacturer: str = "huawei"
+    model: str = "E352"
+    imei: str = "861234567890123"
+    # Time between the +CMGS reply and the +CDS status report, when one was requested
+    delivery_report_sec: float = 1.0
+    # TP-Status of the status report: 0 delivered, 0x20+ still trying, 0x40+ failed
+    delivery_status: int = 0
+    # Number of AT+CHUP/ATH commands answered OK while leaving the call up, like a wedged modem
+    ignored_hangups: int = 0
+
+
+class FakeModem:
+    def __init__(self, config: FakeModemConfig | None = None):
+        self.config = config or FakeModemConfig()
+        self.device_path: str | None = None
+        self.commands: list[str] = []
+        self._master: int | None = None
+        self._slave: int | None = None
+        self._buffer = bytearray()
+        self._in_sms_body = False
+        self._call_state: int | None = None
+        self._call_task: aio.Task | None = None
+        self._ignored_hangups = 0
+        self._message_ref = 0
+        self._pdu_mode = False
+        # Set by AT+CNMI with <ds> 1 and by AT+CSMP with the status report request bit
+        self._forward_reports = False
+        self._request_report = False
+        self._recipient = ""
+        # Set by AT+CNMI with <mt> 1 and AT+CLIP=1
+        self._indicate_messages = False
+        self._caller_id = False
+        # Stored messages by index: sender, text and whether they were read
+        self._inbox: dict[int, list] = {}
+        self._loop: aio.AbstractEventLoop | None = None
+
+    def start(self) -> str:
+        """Open the pseudo-terminal and start answering, returns the device path to connect to."""
+        self._loop = aio.get_running_loop()
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.device_path = os.ttyname(self._slave)
+        self._loop.add_reader(self._master, self._on_readable)
+        return self.device_path
+
+    def stop(self) -> None:
+        if self._call_task is not None:
+            self._call_task.cancel()
+        if self._master is not None:
+            self._loop.remove_reader(self._master)
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = self._slave = None
+
+    def receive_sms(self, sender: str, text: str) -> int:
+        """Store an incoming message and announce it with +CMTI, returns its index."""
+        index = max(self._inbox, default=0) + 1
+        self._inbox[index] = [sender, text, False]
+        if self._indicate_messages:
+            self._reply(f'+CMTI: "SM",{index}')
+        return index
+
+    def ring(self, caller: str) -> None:
+        """Announce one ring of an incoming call."""
+        self._reply("RING", *([f'+CLIP: "{caller}",145,,,,0'] if self._caller_id else []))
+
+    def _write(self, text: str) -> None:
+        if self._master is not None:
+            os.write(self._master, text.encode())
+
+    def _reply(self, *lines: str) -> None:
+        self._write("".join(f"\r\n{line}\r\n" for line in lines))
+
+    def _on_readable(self) -> None:
+        try:
+            self._buffer += os.read(self._master, 4096)
+        except OSError:
+            return
+
+        while self._buffer:
+            if self._in_sms_body:
+                if (end := next((i for i, b in enumerate(self._buffer) if b in (CTRL_Z, ESC)), None)) is None:
+                    return
+                body, terminator = bytes(self._buffer[:end]), self._buffer[end]
+                del self._buffer[:end + 1]
+                self._in_sms_body = False
+                if terminator == CTRL_Z:
+                    self._loop.create_task(self._submit_sms(body.decode(errors="ignore").strip()))
+                continue
+
+            if self._buffer[0] == ESC:
+                del self._buffer[0]
+                continue
+
+            if (end := self._buffer.find(b"\r")) == -1:
+                return
+            command = self._buffer[:end].decode(errors="ignore").strip()
+            del self._buffer[:end + 1]
+            if command:
+                self.commands.append(command)
+                # The body may follow in the same chunk, so switch modes before replying
+                self._in_sms_body = command.upper().startswith("AT+CMGS")
+                self._loop.create_task(self._handle(command))
+
+    async def _handle(self, command: str) -> None:
+        config = self.config
+        await aio.sleep(config.latency_sec)
+
+        if random.random() < config.drop_rate:
+            return
+        if random.random() < config.error_rate:
+            self._in_sms_body = False
+            self._reply("ERROR")
+            return
+
+        upper = command.upper()
+        if upper.startswith("AT+CMGS"):
+            self._recipient = command.partition("=")[2].strip('"')
+            if not config.no_prompt:
+                self._write("\r\n> " if config.bare_prompt else "\r\n> \r\n")
+        elif upper.startswith("ATD"):
+            await self._start_call()
+        elif upper in ("AT+CHUP", "ATH"):
+            if self._ignored_hangups < config.ignored_hangups:
+                self._ignored_hangups += 1
+            else:
+                self._end_call(report=False)
+            self._reply("OK")
+        elif upper == "AT+CFUN=0":
+            self._end_call(report=True)
+            self._reply("OK")
+        elif upper == "AT+CLCC=1":
+            self._reply("OK" if config.call_reports else "ERROR")
+        elif upper == "AT+CLCC":
+            self._reply(*([self._clcc()] if self._call_state is not None else []), "OK")
+        elif upper in ("AT+CREG?", "AT+CEREG?"):
+            self._reply(f"{upper[2:-1]}: 0,{config.registration}", "OK")
+        elif upper == "AT+CSQ":
+            self._reply("+CSQ: 20,99", "OK")
+        elif upper == "AT+CGMI":
+            self._reply(config.manufacturer, "OK")
+        elif upper == "AT+CGMM":
+            self._reply(config.model, "OK")
+        elif upper == "AT+CGMR":
+            self._reply("11.609.18.00.00", "OK")
+        elif upper == "AT+CGSN":
+            self._reply(config.imei, "OK")
+        elif upper == "ATI":
+            self._reply(f"Manufacturer: {config.manufacturer}", f"Model: {config.model}", f"IMEI: {config.imei}", "OK")
+        elif upper == "AT+CMGF=?":
+            self._reply("+CMGF: (0,1)", "OK")
+        elif upper.startswith("AT+CMGF="):
+            self._pdu_mode = upper.endswith("0")
+            self._reply("OK")
+        elif upper.startswith("AT+CNMI="):
+            fields = upper.partition("=")[2].split(",")
+            self._indicate_messages = len(fields) > 1 and fields[1] == "1"
+            self._forward_reports = len(fields) > 3 and fields[3] == "1"
+            self._reply("OK")
+        elif upper == "AT+CLIP=1":
+            self._caller_id = True
+            self._reply("OK")
+        elif upper.startswith("AT+CMGL"):
+            self._reply(*self._list_messages(all_messages=upper.endswith(("=4", '"ALL"'))), "OK")
+        elif upper.startswith("AT+CMGD"):
+            # Several may be joined on one line: AT+CMGD=1;+CMGD=2
+            for index in re.findall(r"\+CMGD=(\d+)", upper):
+                self._inbox.pop(int(index), None)
+            self._reply("OK")
+        elif upper.startswith("AT+CSMP="):
+            self._request_report = bool(int(upper.partition("=")[2].split(",")[0] or 0) & 0x20)
+            self._reply("OK")
+        else:
+            self._reply("OK")
+
+    async def _submit_sms(self, body: str) -> None:
+        await aio.sleep(self.config.sms_submit_sec)
+        self._message_ref = (self._message_ref + 1) % 256
+        self._reply(f"+CMGS: {self._message_ref}", "OK")
+
+        if self._pdu_mode:
+            # Skip the SMSC address to the first octet, then TP-MR to the recipient's digit count
+            tpdu = bytes.fromhex(body)[1 + int(body[:2], 16):]
+            requested = bool(tpdu[0] & 0x20)
+            digits = tpdu[2]
+            swapped = tpdu[4:4 + (digits + 1) // 2].hex().upper()
+            recipient = "".join(swapped[i + 1] + swapped[i] for i in range(0, len(swapped), 2))[:digits]
+        else:
+            requested, recipient = self._request_report, self._recipient
+        if requested and self._forward_reports:
+            self._loop.call_later(
+                self.config.delivery_report_sec, self._status_report, self._message_ref, recipient.lstrip("+")
+            )
+
+    def _list_messages(self, all_messages: bool) -> list[str]:
+        lines = []
+        for index, message in self._inbox.items():
+            sender, text, read = message
+            if read and not all_messages:
+                continue
+            message[2] = True
+            if not self._pdu_mode:
+                lines += [f'+CMGL: {index},"REC {"READ" if read else "UNREAD"}","{sender}",,"26/10/18,12:00:00+08"', text]
+                continue
+
+            # SMS-DELIVER in UCS-2, which needs no septet packing
+            digits = sender.lstrip("+")
+            padded = digits + "F" * (len(digits) % 2)
+            address = f"{len(digits):02X}91" + "".join(padded[i + 1] + padded[i] for i in range(0, len(padded), 2))
+            user_data = text.encode("utf-16-be")
+            pdu = f"0004{address}000862018121000080{len(user_data):02X}{user_data.hex().upper()}"
+            lines += [f"+CMGL: {index},{int(read)},,{len(pdu) // 2 - 1}", pdu]
+        return lines
+
+    def _status_report(self, reference: int, recipient: str) -> None:
+        status = self.config.delivery_status
+        if not self._pdu_mode:
+            timestamp = '"26/10/18,12:00:00+08"'
+            self._reply(f'+CDS: 6,{reference},"+{recipient}",145,{timestamp},{timestamp},{status}')
+            return
+
+        padded = recipient + "F" * (len(recipient) % 2)
+        address = f"{len(recipient):02X}91" + "".join(padded[i + 1] + padded[i] for i in range(0, len(padded), 2))
+        timestamp = "62018121000080"
+        pdu = f"0006{reference:02X}{address}{timestamp}{timestamp}{status:02X}"
+        self._reply(f"+CDS: {len(pdu) // 2 - 1}", pdu)
+
+    def _clcc(self) -> str:
+        return f'+CLCC: 1,0,{self._call_state},0,0,"+40700000000",145'
+
+    def _set_call_state(self, state: int, vendor_urc: str) -> None:
+        self._call_state = state
+        if not self.config.call_reports:
+            return
+        if not self.config.quectel_urcs:
+            self._reply(self._clcc(), vendor_urc)
+        elif state == ACTIVE:
+            self._reply("VOICE CALL: BEGIN")
+
+    async def _start_call(self) -> None:
+        if self.config.outcome == "busy":
+            self._reply("BUSY")
+            return
+
+        if not self.config.dial_reply_sec:
+            self._reply("OK")
+        self._set_call_state(DIALING, "^ORIG:1,0")
+        self._call_task = self._loop.create_task(self._call_timeline())
+        if self.config.dial_reply_sec:
+            await aio.sleep(self.config.dial_reply_sec)
+            self._reply("OK")
+
+    async def _call_timeline(self) -> None:
+        config = self.config
+        await aio.sleep(config.ring_after_sec)
+        self._set_call_state(RINGING, "^CONF:1")
+
+        if config.outcome == "no_answer":
+            return
+
+        await aio.sleep(config.outcome_after_sec)
+        if config.outcome == "answer":
+            self._set_call_state(ACTIVE, "^CONN:1,0")
+        else:
+            self._end_call(report=True)
+
+    def _end_call(self, report: bool) -> None:
+        if self._call_task is not None and self._call_task is not aio.current_task():
+            self._call_task.cancel()
+        self._call_task = None
+
+        if self._call_state is not None and report:
+            self._reply("VOICE CALL: END: 000010" if self.config.quectel_urcs else "^CEND:1,0,104,17", "NO CARRIER")
+        self._call_state = None
+
+
+def _parse_args() -> FakeModemConfig:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = FakeModemConfig()
+    for name, value in vars(defaults).items():
+        flag = f"--{name.replace('_', '-')}"
+        if isinstance(value, bool):
+            parser.add_argument(flag, action=argparse.BooleanOptionalAction, default=value)
+        else:
+            parser.add_argument(flag, type=type(value), default=value)
+    return FakeModemConfig(**vars(parser.parse_args()))
+
+
+async def _main(config: FakeModemConfig) -> None:
+    modem = FakeModem(config)
+    print(f"Fake modem listening on {modem.start()}", flush=True)
+    try:
+        await aio.Event().wait()
+    finally:
+        modem.stop()
+
+
+if __name__ == "__main__":
+    try:
+        aio.run(_main(_parse_args()))
+    except KeyboardInterrupt:
+        pass